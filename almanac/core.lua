@@ -296,9 +296,21 @@ end
 -- Entry --
 ---------------------------------------------------
 local Entry = {}
-Entry.__index = Entry
 
-function Entry:new(group, id, value)
+function Entry.__index(tbl, key)
+    -- lazy entries read their data the first time it's used
+    if key == "data" and rawget(tbl, "lazy") then
+        local data = util.file.json_entry(tbl.group.path, tbl.id)
+        rawset(tbl, "data", data)
+        
+        return data
+    end
+    
+    return Entry[key]
+end
+
+-- If value is nil, the entry is lazy and only has the index fields for now
+function Entry:new(group, id, value, index)
     local obj = {}
     setmetatable(obj, self)
     
@@ -306,6 +318,11 @@ function Entry:new(group, id, value)
     obj.id = id
     obj.data = value
     
+    if value == nil then
+        obj.lazy = true
+        obj.index_data = index
+    end
+    
     return obj
 end
 
@@ -313,29 +330,69 @@ function Entry:get(key)
     return self.data[key]
 end
 
+-- Fields used for searching, doesn't need to read lazy entries
+function Entry:index()
+    return rawget(self, "index_data") or self.data
+end
+
 ---------------------------------------------------
 -- Section --
 ---------------------------------------------------
 local Section = {}
 Section.__index = Section
 
-function Section:new(path)
+function Section:new(path, fields)
     local obj = {}
     setmetatable(obj, self)
     
     obj.path = path
     
-    obj:read()
+    obj:read(fields)
     
     return obj
 end
 
-function Section:read()
-    local raw = util.json_read(self.path)
-    
+-- Fields that entries always have loaded, used for searching
+-- everything else is only read when the entry gets used
+local index_fields = {"name", "DISPLAY_NAME", "ALT_NAME", "HARD_ALT_NAME"}
+
+-- fields = more fields to have loaded, for code that goes through every entry
+function Section:read(fields)
     self.entries = {}
     setmetatable(self.entries, util.misc.ordered_table)
     
+    -- field -> true, for every field the entries have loaded
+    self.fields = {}
+    
+    local keys = {}
+    
+    for i, key in ipairs(index_fields) do
+        self.fields[key] = true
+        table.insert(keys, key)
+    end
+    
+    for i, key in ipairs(fields or {}) do
+        if not self.fields[key] then
+            self.fields[key] = true
+            table.insert(keys, key)
+        end
+    end
+    
+    -- try reading only the index first
+    local index = util.file.json_index(self.path, keys)
+    
+    if index then
+        self.lazy = true
+        
+        for k, p in pairs(index) do
+            self.entries[k] = Entry:new(self, k, nil, p)
+        end
+        
+        return
+    end
+    
+    local raw = util.json_read(self.path)
+    
     for k, p in pairs(raw) do
         if type(p) == "table" then
             self.entries[k] = Entry:new(self, k, p)
@@ -343,6 +400,36 @@ function Section:read()
     end
 end
 
+-- Loads more fields in the entries that were already made, so anything using them keeps working
+function Section:add_fields(fields)
+    local keys = {}
+    
+    for i, key in ipairs(fields) do
+        if not self.fields[key] then
+            self.fields[key] = true
+            table.insert(keys, key)
+        end
+    end
+    
+    -- entries that were read whole already have everything
+    if #keys == 0 or not self.lazy then
+        return
+    end
+    
+    local index = util.file.json_index(self.path, keys)
+    
+    for k, p in pairs(index) do
+        local entry = self.entries[k]
+        local data = entry and rawget(entry, "index_data")
+        
+        if data then
+            for key, value in pairs(p) do
+                data[key] = value
+            end
+        end
+    end
+end
+
 function Section:get(entry)
     local e = self.entries[entry]
     
@@ -366,9 +453,13 @@ local almanac = {
 
 local sections = {}
 
-function almanac.get(path)
+-- Sections are only read once, fields missing from one that was already read are added to it
+function almanac.get(path, fields)
     if not sections[path] then
-        sections[path] = Section:new(path)
+        sections[path] = Section:new(path, fields)
+        
+    elseif fields then
+        sections[path]:add_fields(fields)
     end
     
     return sections[path]
@@ -30,7 +30,8 @@ local Equip = {}
 Character.__index = Character
 setmetatable(Character, workspaces.Character)
 
-Character.section = almanac.get("database/feh/char.json")
+-- the closest heroes are found with these, without reading every hero
+Character.section = almanac.get("database/feh/char.json", {"id", "weapon", "color", "move", "rarity", "weapons"})
 
 Character.allow_show_growth = false
 Character.allow_show_cap = false
@@ -195,13 +196,12 @@ function Character:show_info()
     
     -------------------
     -- Similar Page
-    --[[
     local similarbox = Infobox:new()
     
-    for key, value in pairs(self.data.close) do
+    for key, value in pairs(self:get_close()) do
         similarbox:insert(key, value, true)
     end
-    --]]
+    
     --------------------
     -- Page box
     local pagebox = Pagebox:new()
@@ -209,12 +209,12 @@ function Character:show_info()
     pagebox:page(infobox)
     pagebox:page(skillbox)
     pagebox:page(miscbox)
-    --pagebox:page(similarbox)
+    pagebox:page(similarbox)
     
     pagebox:stats_button()
     pagebox:button({label = "Skills", page = 1, emoji = "manual"})
     pagebox:button({label = "Misc.", page = 2, emoji = "bubble"})
-    --pagebox:button({label = "Similar", page = 3, emoji = "bubble"})
+    pagebox:button({label = "Similar", page = 3, emoji = "bubble"})
     
     pagebox:set({title = self:fancy_name(), color = embed_color[self.data.color]})
     
@@ -1222,56 +1222,61 @@ setmetatable(Equip, almanac.Workspace)
 Equip.section = almanac.get("database/feh/equip.json")
 
 ---------------------------------------------------
--- Init --
+-- Closest heroes --
 ---------------------------------------------------
 -- Thing used to determine which units are the closest to each other
-
--- Sort the heroes by ID
-local table_id = {}
-
-for key, value in pairs(Character.section.entries) do
-    local data = value.data
-    
-    local hero_id = tonumber(data.id)
-    
-    table_id[hero_id] = key
-end
+-- Made the first time a hero needs it instead of on boot, and kept after that
 
 local SEARCH_LIMIT = 3
 
--- Uncomment this to enable it again
--- Bot takes a long time to boot up if this is a thing
 local search_tasks = {
-    --{name = "Task1", same = {"weapon", "color", "move"}},
-    --{name = "Task2", same = {"weapon", "color"}},
-    --{name = "Task3", same = {"move"}}
+    {name = "Weapon & Move", same = {"weapon", "color", "move"}},
+    {name = "Weapon", same = {"weapon", "color"}},
+    {name = "Move", same = {"move"}}
 }
 
--- Find closest heroes that share the same class and move
-for key, value in pairs(Character.section.entries) do
-    local hero = value.data
-    
-    local hero_id = tonumber(hero.id)
+-- Heroes by ID, only made once
+-- uses the index of the section, so the heroes don't need to be read
+local table_id
+
+local function get_table_id()
+    if table_id == nil then
+        table_id = {}
+        
+        for key, value in pairs(Character.section.entries) do
+            local hero_id = tonumber(value:index().id)
+            
+            table_id[hero_id] = key
+        end
+    end
     
-    -- The pools are as follows:
-    -- Premium = 5 star-locked units that have a prf weapon.
-    -- Fodder = 5 star-locked units that don't have a prf weapon.
-    -- Freemium = Non 5 star-locked units.
-    local function get_pool(data)
-        if 5 == data.rarity then
-            local has_prf = string.sub(data.weapons[-1], -1) ~= "+"
+    return table_id
+end
+
+-- The pools are as follows:
+-- Premium = 5 star-locked units that have a prf weapon.
+-- Fodder = 5 star-locked units that don't have a prf weapon.
+-- Freemium = Non 5 star-locked units.
+local function get_pool(data)
+    if 5 == data.rarity then
+        local has_prf = string.sub(data.weapons[-1], -1) ~= "+"
+        
+        if has_prf then
+            return "premium"
             
-            if has_prf then
-                return "premium"
-                
-            else
-                return "fodder"
-            end
         else
-            return "freemium"
+            return "fodder"
         end
+    else
+        return "freemium"
     end
+end
+
+-- Find closest heroes that share the same class and move
+local function find_close(hero)
+    local table_id = get_table_id()
     
+    local hero_id = tonumber(hero.id)
     local hero_pool = get_pool(hero)
     
     local function check_lots(check_keys, add_loop)
@@ -1287,7 +1292,7 @@ for key, value in pairs(Character.section.entries) do
             
             -- If ID exists
             if table_id[search] ~= nil then
-                local hero_compare = Character.section.entries[table_id[search]].data
+                local hero_compare = Character.section.entries[table_id[search]]:index()
                 
                 local function check_same()
                     for i, k in ipairs(check_keys) do
@@ -1320,9 +1325,8 @@ for key, value in pairs(Character.section.entries) do
         return results
     end
     
-    hero.oifey_pool = hero_pool
-    hero.close = {}
-    setmetatable(hero.close, util.ordered_table)
+    local close = {}
+    setmetatable(close, util.ordered_table)
     
     for i, search in ipairs(search_tasks) do
         local newer = check_lots(search.same)
@@ -1342,12 +1346,27 @@ for key, value in pairs(Character.section.entries) do
                 text = "None"
             end
             
-            hero.close[title] = text
+            close[title] = text
         end
         
         check(newer, search.name .. " Newer")
         check(older, search.name .. " Older")
     end
+    
+    return close
+end
+
+-- hero id -> closest heroes
+local closest = {}
+
+function Character:get_close()
+    local hero = self.data
+    
+    if closest[hero.id] == nil then
+        closest[hero.id] = find_close(hero)
+    end
+    
+    return closest[hero.id]
 end
 
 return {
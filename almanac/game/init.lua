@@ -1,22 +1,34 @@
-local init = {
-    fe1 = require("almanac.game.fe1"),
-    fe2 = require("almanac.game.fe2"),
-    fe4 = require("almanac.game.fe4"),
-    fe5 = require("almanac.game.fe5"),
-    fe6 = require("almanac.game.fe6"),
-    fe7 = require("almanac.game.fe7"),
-    fe8 = require("almanac.game.fe8"),
-    fe9 = require("almanac.game.fe9"),
-    fe10 = require("almanac.game.fe10"),
-    fe11 = require("almanac.game.fe11"),
-    fe12 = require("almanac.game.fe12"),
-    fe13 = require("almanac.game.fe13"),
-    fe14 = require("almanac.game.fe14"),
-    fe15 = require("almanac.game.fe15"),
-    fe16 = require("almanac.game.fe16"),
-    fe17 = require("almanac.game.fe17"),
-    feh = require("almanac.game.feh"),
-    cipher = require("almanac.game.cipher")
+local games = {
+    fe1 = "almanac.game.fe1",
+    fe2 = "almanac.game.fe2",
+    fe4 = "almanac.game.fe4",
+    fe5 = "almanac.game.fe5",
+    fe6 = "almanac.game.fe6",
+    fe7 = "almanac.game.fe7",
+    fe8 = "almanac.game.fe8",
+    fe9 = "almanac.game.fe9",
+    fe10 = "almanac.game.fe10",
+    fe11 = "almanac.game.fe11",
+    fe12 = "almanac.game.fe12",
+    fe13 = "almanac.game.fe13",
+    fe14 = "almanac.game.fe14",
+    fe15 = "almanac.game.fe15",
+    fe16 = "almanac.game.fe16",
+    fe17 = "almanac.game.fe17",
+    feh = "almanac.game.feh",
+    cipher = "almanac.game.cipher"
 }
 
+-- Games are only loaded the first time they're used
+local init = {}
+
+setmetatable(init, {__index = function(tbl, key)
+    if games[key] then
+        local game = require(games[key])
+        rawset(tbl, key, game)
+        
+        return game
+    end
+end})
+
 return init
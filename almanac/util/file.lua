@@ -2,6 +2,16 @@ local json = require("almanac.lib.json")
 
 local module = {}
 
+-- Optional decoder that gets a path and returns the same tables as json.decode
+-- Set from outside almanac (like lua.py using Python's json module) to load faster
+module.decode = nil
+
+-- Optional functions to only read the entries of a file when they're used
+-- decode_index(path, fields) returns every entry with only those fields, or nil if it can't
+-- decode_entry(path, id) returns the whole entry
+module.decode_index = nil
+module.decode_entry = nil
+
 function module.read(path)
     local file = io.open(path, "r")
     
@@ -17,6 +27,10 @@ end
 
 function module.json_read(path)
     local function thing()
+        if module.decode then
+            return module.decode(path)
+        end
+        
         return json.decode(module.read(path))
     end
     
@@ -26,7 +40,34 @@ function module.json_read(path)
         return data
         
     else
-        error("JSON ERROR: " .. path .. "|" .. data)
+        error("JSON ERROR: " .. path .. "|" .. tostring(data))
+    end
+end
+
+-- Returns nil if there's no way to read an index
+function module.json_index(path, fields)
+    if not module.decode_index then
+        return nil
+    end
+    
+    local status, data = pcall(module.decode_index, path, fields)
+    
+    if status then
+        return data
+        
+    else
+        error("JSON ERROR: " .. path .. "|" .. tostring(data))
+    end
+end
+
+function module.json_entry(path, id)
+    local status, data = pcall(module.decode_entry, path, id)
+    
+    if status then
+        return data
+        
+    else
+        error("JSON ERROR: " .. path .. "|" .. tostring(data))
     end
 end
 
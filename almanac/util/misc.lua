@@ -1,82 +1,162 @@
 -------------------------------------
 -- Ordered metatable
 -------------------------------------
+-- The array part has the keys in order and the values are stored in the
+-- keys themselves, so ipairs/# and python can still read the order raw.
+-- A slot is only valid if the key still has a value and pos[key] points
+-- to it, old slots are left behind and removed together once there's enough.
 local ordered_table = {}
 
-function ordered_table.__newindex(t, k, v)
-    if v ~= nil then
-        if t[k] == nil then
-            rawset(t, #t + 1, k)
-        end
-        
-        rawset(t, k, v)
+-- pos[key] = slot and stale = number of invalid slots, for each table
+local states = setmetatable({}, {__mode = "k"})
+
+local function get_state(t)
+    local state = states[t]
+    
+    if state == nil then
+        state = {pos = {}, stale = 0}
         
-    else
-        for i, p in ipairs(t) do
-            if p == k then
-                table.remove(t, i)
-                
-                rawset(t, k, nil)
-                
-                return
+        for i=1, #t do
+            local key = rawget(t, i)
+            
+            if state.pos[key] ~= nil then
+                state.stale = state.stale + 1
             end
+            
+            state.pos[key] = i
         end
+        
+        states[t] = state
+    end
+    
+    return state
+end
+
+-- check slot, forget keys that lost their value
+local function is_valid(t, state, i)
+    local key = rawget(t, i)
+    
+    if state.pos[key] ~= i then return false end
+    
+    if rawget(t, key) == nil then
+        state.pos[key] = nil
+        state.stale = state.stale + 1
+        
+        return false
     end
+    
+    return true
 end
 
 -- remove invalid keys
-local function filter_invalid(t)
-    local rm = {}
+local function compact(t, state)
+    local size = #t
+    local n = 0
     
-    for i=1, #t do
+    for i=1, size do
         local key = rawget(t, i)
         
-        if rawget(t, key) == nil then
-            table.insert(rm, key)
+        if is_valid(t, state, i) then
+            n = n + 1
+            
+            rawset(t, n, key)
+            state.pos[key] = n
         end
     end
     
-    for _, p in ipairs(rm) do
-        ordered_table.__newindex(t, p, nil)
+    for i=n + 1, size do
+        rawset(t, i, nil)
     end
- end
- 
-function ordered_table.__pairs(t)
-    filter_invalid(t)
     
-    local i = 1
+    state.stale = 0
+end
+
+-- only compact once at least half of the slots are invalid
+local function check_stale(t, state)
+    if state.stale > 0 and state.stale * 2 >= #t then
+        compact(t, state)
+    end
+end
+
+function ordered_table.__newindex(t, k, v)
+    local state = get_state(t)
+    local i = state.pos[k]
     
-    local function iter(t, k)
-        k = t[i]
-        i = i + 1
-        
-        local v = t[k]
-        
-        if v ~= nil then return k,v end
+    -- drop the old slot of the key, if it still has one
+    if i ~= nil and rawget(t, i) == k then
+        state.pos[k] = nil
+        state.stale = state.stale + 1
     end
     
-    local function old_iter(t, k)
-        local v
-        
-        k, v = next(t, k)
+    if v ~= nil then
+        local n = #t + 1
         
-        if nil~=v then return k,v end
+        rawset(t, n, k)
+        state.pos[k] = n
     end
     
-    if t[1] then
-        return iter, t, nil
-    else
+    rawset(t, k, v)
+    
+    check_stale(t, state)
+end
+
+function ordered_table.__pairs(t)
+    if rawget(t, 1) == nil then
+        local function old_iter(t, k)
+            local v
+            
+            k, v = next(t, k)
+            
+            if nil~=v then return k,v end
+        end
+        
         return old_iter, t, nil
     end
+    
+    local state = get_state(t)
+    check_stale(t, state)
+    
+    local i = 0
+    
+    local function iter(t, k)
+        while true do
+            i = i + 1
+            
+            k = rawget(t, i)
+            
+            if k == nil then return end
+            
+            if is_valid(t, state, i) then return k, rawget(t, k) end
+        end
+    end
+    
+    return iter, t, nil
 end
 
 function ordered_table.__index(tbl, key)
-    filter_invalid(tbl)
-    
     if type(key) == "number" and key < 0 then
-        local value = rawget(tbl, #tbl + 1 + key)
+        local state = get_state(tbl)
+        local i = #tbl
         
-        return value
+        -- drop invalid slots at the end while looking
+        while i > 0 and not is_valid(tbl, state, i) do
+            rawset(tbl, i, nil)
+            state.stale = math.max(state.stale - 1, 0)
+            
+            i = i - 1
+        end
+        
+        for _=key + 2, 0 do
+            i = i - 1
+            
+            while i > 0 and not is_valid(tbl, state, i) do
+                i = i - 1
+            end
+        end
+        
+        if i > 0 then
+            return rawget(tbl, i)
+        end
     end
     
     return nil
@@ -33,6 +33,12 @@ class Oifey(discord.AutoShardedClient):
         
         self.owner = OWNER_ID
 
+    async def close(self) -> None:
+        if self.maji:
+            await self.maji.close()
+            
+        await super().close()
+
     async def on_ready(self) -> None:
         print(f"Logged in as {self.user} {self.user.id}!")
         change_status.start()
@@ -50,6 +56,14 @@ class Oifey(discord.AutoShardedClient):
         if self.maji:
             await self.maji.check(ctx)
 
+    async def on_raw_message_delete(self, payload) -> None:
+        if self.maji:
+            self.maji.messages_deleted([payload.message_id])
+
+    async def on_raw_bulk_message_delete(self, payload) -> None:
+        if self.maji:
+            self.maji.messages_deleted(payload.message_ids)
+
 
 intents = discord.Intents.default()
 
@@ -1,7 +1,163 @@
-import lupa
+import lupa, json
 from lupa import LuaRuntime
 
 lua = LuaRuntime(unpack_returned_tuples=True)
+
+# Decode almanac's JSON files with Python's json module (C) instead of the
+# pure Lua decoder, the tables are built the same way almanac.lib.json does
+ordered_table = lua.eval('(require("almanac.util.misc"))').ordered_table
+
+# lupa passes python ints as floats, which can't hold big ids (like emojis)
+# so ints are passed as strings and turned into numbers here, like json.lua does
+make_table = lua.eval('''function(tbl, ints, meta)
+    if ints then
+        for _, k in ipairs(ints) do
+            rawset(tbl, k, tonumber(rawget(tbl, k)))
+        end
+    end
+    
+    if meta then
+        setmetatable(tbl, meta)
+    end
+    
+    return tbl
+end''')
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def json_to_table(data):
+    if isinstance(data, dict):
+        keys = []
+        values = {}
+        ints = []
+        
+        # null values are skipped, same as assigning nil to a lua table
+        for key, value in data.items():
+            if value is None: continue
+            
+            keys.append(key)
+            
+            if is_int(value):
+                values[key] = str(value)
+                ints.append(key)
+                
+            else:
+                values[key] = json_to_table(value)
+        
+        # ordered tables keep the keys in order on the array part
+        tbl = lua.table_from(keys, values)
+        
+        return make_table(tbl, lua.table_from(ints) if ints else None, ordered_table)
+        
+    elif isinstance(data, list):
+        tbl = lua.table_from([str(x) if is_int(x) else json_to_table(x) for x in data])
+        ints = [i + 1 for i, x in enumerate(data) if is_int(x)]
+        
+        if ints:
+            return make_table(tbl, lua.table_from(ints), None)
+            
+        return tbl
+        
+    else:
+        return data
+
+def json_read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json_to_table(json.load(f))
+
+# path -> {entry id: (byte start, byte size)}, for reading entries later
+json_offsets = {}
+
+def json_index(path, fields):
+    """Reads only some fields of every entry (table) in a JSON object
+    The whole entry can be read later with json_entry"""
+    fields = list(fields.values())
+    
+    with open(path, "rb") as f:
+        raw = f.read()
+        
+    text = raw.decode("utf-8")
+    
+    decoder = json.JSONDecoder()
+    whitespace = json.decoder.WHITESPACE
+    
+    i = whitespace.match(text, 0).end()
+    
+    # only objects have entries
+    if text[i:i + 1] != "{":
+        return None
+    
+    # raw_decode works on characters, but files are read with bytes
+    position = [0, 0]
+    
+    def to_byte(char):
+        if len(raw) != len(text):
+            position[1] += len(text[position[0]:char].encode("utf-8"))
+            position[0] = char
+            
+            return position[1]
+            
+        return char
+    
+    index = {}
+    offsets = {}
+    
+    i = whitespace.match(text, i + 1).end()
+    
+    while text[i] != "}":
+        key, i = decoder.raw_decode(text, i)
+        
+        i = whitespace.match(text, i).end()
+        
+        if text[i] != ":":
+            raise ValueError(f"Expected ':' at {i}")
+        
+        start = whitespace.match(text, i + 1).end()
+        value, i = decoder.raw_decode(text, start)
+        
+        if isinstance(value, dict) or isinstance(value, list):
+            byte = to_byte(start)
+            
+            offsets[key] = (byte, to_byte(i) - byte)
+            
+            if isinstance(value, dict):
+                index[key] = {k: v for k, v in value.items() if k in fields}
+                
+            else:
+                index[key] = {}
+                
+        # same as json.decode, the last value with the same key is the one used
+        elif key in index:
+            index.pop(key)
+            offsets.pop(key)
+        
+        i = whitespace.match(text, i).end()
+        
+        if text[i] == ",":
+            i = whitespace.match(text, i + 1).end()
+            
+        elif text[i] != "}":
+            raise ValueError(f"Expected ',' or '}}' at {i}")
+    
+    json_offsets[path] = offsets
+    
+    return json_to_table(index)
+
+def json_entry(path, key):
+    start, size = json_offsets[path][key]
+    
+    with open(path, "rb") as f:
+        f.seek(start)
+        
+        return json_to_table(json.loads(f.read(size)))
+
+file = lua.eval('(require("almanac.util.file"))')
+
+file.decode = json_read
+file.decode_index = json_index
+file.decode_entry = json_entry
+
 almanac, _ = lua.eval('require("almanac")')
 almanac.load_game()
 
@@ -18,4 +174,11 @@ def to_table(d):
         else:
             new[key] = value
             
-    return lua.table_from(new)
\ No newline at end of file
+    return lua.table_from(new)
+
+def from_table(tbl):
+    """Lua table to dict, so it can be sent to other processes"""
+    if lupa.lua_type(tbl) == "table":
+        return {key: from_table(value) for key, value in tbl.items()}
+        
+    return tbl
@@ -19,6 +19,9 @@ async def exit(ctx):
         return
     
     print("Shutting down...")
+    oifey.worker.stop()
+    oifey.sql.flush()
+    
     await client.close()
 
 # Load Modules
@@ -34,6 +37,15 @@ oifey.module.get_module_file("oifey/modules/holy.json")
 oifey.module.get_module_file("oifey/modules/tellius.json")
 oifey.module.get_module_file("oifey/modules/thracia.json")
 
+# save search pools for the next boot
+oifey.pool.save_snapshot()
+
+# local images, checked with this instead of the disk
+maji.attachment.index()
+
+# start the workers with everything already loaded
+oifey.worker.start()
+
 # Shortcuts
 class Shortcut:
     def __init__(self, game, command):
@@ -77,21 +89,23 @@ async def random_command(ctx):
 engage = oifey.modules["fe17"]
 
 class SommieButton(maji.Button):
-    def action(self, interaction):
-        user = oifey.user.get(-1)
-        
-        if not "sommie" in user:
-            user["sommie"] = 0
-        
-        user["sommie"] += 1
-        
-        oifey.user.update(-1, user)
-        
-        edit = self.parent.pages[1]
-        
-        edit.description = edit.description.format(user["sommie"])
-        
-        super().action(interaction)
+    async def callback(self, interaction):
+        # counted here, action can't wait for the database
+        if self.parent and self.parent.owner == interaction.user.id:
+            user = await oifey.user.get_async(-1)
+            
+            if not "sommie" in user:
+                user["sommie"] = 0
+            
+            user["sommie"] += 1
+            
+            oifey.user.update(-1, user)
+            
+            edit = self.parent.pages[1]
+            
+            edit.description = edit.description.format(user["sommie"])
+            
+        await super().callback(interaction)
 
 async def sommie(ctx):
     embed1 = maji.Embed(desc = "You have found Sommie! Do you wish to pet him?")
@@ -110,7 +124,7 @@ async def sommie_set(ctx):
     if ctx.author.id != client.owner:
         return
         
-    user = oifey.user.get(-1)
+    user = await oifey.user.get_async(-1)
     
     user["sommie"] = int(ctx.content)
     
@@ -0,0 +1,392 @@
+import discord, aiohttp
+import io, os, json, time, hashlib, asyncio, atexit
+
+from urllib.parse import urlparse, parse_qs
+
+from collections import OrderedDict
+
+# Local images are kept in memory after they're sent, the least used ones are removed
+# max size (bytes) of all the images kept
+CACHE_BYTES = 64 * 1024 * 1024
+# bigger files are always read from the disk
+FILE_BYTES = 8 * 1024 * 1024
+
+# Folders indexed on startup, files in them are checked with the index instead of the disk
+FOLDERS = ["database"]
+
+# Smaller versions of the images for each embed key, made by scripts/build_images.py
+VARIANT_FOLDER = ".oifey/images"
+MANIFEST_FILE = VARIANT_FOLDER + "/manifest.json"
+
+# Links (discord CDN) of files that were already sent, by the hash of the file
+# so the same image isn't uploaded again
+URL_FILE = ".oifey/media.json"
+# links without an expiry date are uploaded again after this (seconds)
+URL_TTL = 60 * 60 * 12
+# stop using a link this long before it expires
+URL_MARGIN = 60 * 60
+# links are checked again after this (seconds), the file is uploaded while it's checked
+# they stop working when their message is deleted or edited while the bot is offline
+URL_CHECK = 60 * 60
+# seconds to wait before saving new links
+SAVE_DELAY = 30.0
+
+# path -> size, None until the folders are indexed
+files = None
+
+# path -> bytes, least recently used first
+data = OrderedDict()
+size = 0
+
+# path -> {"size", "mtime", "keys": {key: path of the variant}}, None until it's loaded
+manifest = None
+variants = set()
+
+# path -> hash of the file
+hashes = {}
+
+# hash -> {"url", "expires", "message", "channel"}, None until they're loaded
+urls = None
+save_handle = None
+
+# hash -> when the link was last known to work, links loaded from the file are checked first
+checked = {}
+checking = set()
+
+stats = {
+    "hits": 0,
+    "misses": 0,
+    "links": 0,
+    "uploads": 0,
+    "dropped": 0
+}
+
+def get_path(file_path):
+    return os.path.normpath(file_path)
+
+def index(folders = FOLDERS):
+    """Find every file in the folders, exists() only checks this after"""
+    global files
+    
+    files = {}
+    
+    for folder in folders:
+        for root, dirs, names in os.walk(folder):
+            for name in names:
+                path = os.path.join(root, name)
+                
+                files[get_path(path)] = os.path.getsize(path)
+                
+    print(f"Indexed {len(files)} files")
+
+def is_indexed(path):
+    for folder in FOLDERS:
+        folder = get_path(folder)
+        
+        if path == folder or path.startswith(folder + os.sep):
+            return True
+            
+    return False
+
+def exists(file_path) -> bool:
+    if files is None:
+        index()
+        
+    path = get_path(file_path)
+    
+    if path in files or path in variants:
+        return True
+        
+    # anything outside the indexed folders still needs the disk
+    elif not is_indexed(path):
+        return os.path.isfile(path)
+        
+    return False
+
+def load_manifest():
+    global manifest
+    
+    manifest = {}
+    variants.clear()
+    
+    if not os.path.isfile(MANIFEST_FILE):
+        return
+        
+    try:
+        with open(MANIFEST_FILE, "r") as f:
+            manifest = json.load(f)["files"]
+            
+    except (OSError, ValueError, KeyError) as e:
+        print("Couldn't read the image manifest:", repr(e))
+        return
+        
+    for value in manifest.values():
+        for path in value["keys"].values():
+            variants.add(get_path(path))
+
+def get_variant(file_path, key):
+    """Path of the version of the image made for the embed key, or the same path if there isn't one"""
+    if manifest is None:
+        load_manifest()
+        
+    path = get_path(file_path)
+    value = manifest.get(path)
+    
+    if value is None or not key in value["keys"]:
+        return file_path
+        
+    # changed after the variants were made
+    if files is not None and path in files and files[path] != value["size"]:
+        return file_path
+        
+    return value["keys"][key]
+
+def read(file_path):
+    """Bytes of a file, from memory if it's been read before
+    None if it can't be read"""
+    global size
+    
+    path = get_path(file_path)
+    
+    if path in data:
+        data.move_to_end(path)
+        stats["hits"] += 1
+        
+        return data[path]
+        
+    stats["misses"] += 1
+    
+    try:
+        with open(path, "rb") as f:
+            value = f.read()
+            
+    # removed after it was indexed
+    except OSError:
+        if files is not None:
+            files.pop(path, None)
+            
+        return None
+        
+    if len(value) <= FILE_BYTES:
+        data[path] = value
+        size += len(value)
+        
+        while size > CACHE_BYTES:
+            _, old = data.popitem(last=False)
+            size -= len(old)
+            
+    return value
+
+def get_file(file_path, filename):
+    """discord.File of a local file, None if it can't be read
+    BytesIO uses the cached bytes without copying them until it's written to"""
+    value = read(file_path)
+    
+    if value is None:
+        return None
+        
+    return discord.File(io.BytesIO(value), filename=filename)
+
+def get_hash(file_path):
+    path = get_path(file_path)
+    
+    if not path in hashes:
+        value = read(path)
+        
+        if value is None:
+            return None
+            
+        hashes[path] = hashlib.sha1(value).hexdigest()
+        
+    return hashes[path]
+
+def load_urls():
+    global urls
+    
+    urls = {}
+    
+    if not os.path.isfile(URL_FILE):
+        return
+        
+    try:
+        with open(URL_FILE, "r") as f:
+            data = json.load(f)
+            
+    except (OSError, ValueError) as e:
+        print("Couldn't read the saved links:", repr(e))
+        return
+        
+    now = time.time()
+    
+    for key, value in data.items():
+        if is_valid(value, now):
+            urls[key] = value
+
+def is_valid(value, now):
+    return now < value["expires"] - URL_MARGIN
+
+def get_url(file_path):
+    """Link of a file that was sent before, None if it needs to be uploaded"""
+    if urls is None:
+        load_urls()
+        
+    key = get_hash(file_path)
+    
+    if not key in urls:
+        return None
+        
+    value = urls[key]
+    now = time.time()
+    
+    # expired links are dropped, the file is uploaded again and the new link is saved
+    if not is_valid(value, now):
+        urls.pop(key)
+        return None
+        
+    if now - checked.get(key, 0) > URL_CHECK:
+        check(key)
+        
+        return None
+        
+    stats["links"] += 1
+    
+    return value["url"]
+    
+def check(key):
+    """Check if the link still works in the background"""
+    if key in checking:
+        return
+        
+    try:
+        loop = asyncio.get_running_loop()
+        
+    except RuntimeError:
+        return
+        
+    checking.add(key)
+    
+    task = loop.create_task(check_url(key, urls[key]["url"]))
+    task.add_done_callback(lambda x: checking.discard(key))
+    
+async def check_url(key, url):
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.head(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                status = response.status
+                
+    # can't tell, checked again the next time it's used
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return
+        
+    # replaced while it was checked
+    if not key in urls or urls[key]["url"] != url:
+        return
+        
+    if status == 200:
+        checked[key] = time.time()
+        
+    elif status in (403, 404):
+        urls.pop(key)
+        
+        stats["dropped"] += 1
+        schedule()
+        
+def drop_messages(ids):
+    """Removes the links of deleted messages"""
+    if not urls:
+        return
+        
+    ids = set(ids)
+    
+    remove = [key for key, value in urls.items() if value.get("message") in ids]
+    
+    for key in remove:
+        urls.pop(key)
+        
+    if remove:
+        stats["dropped"] += len(remove)
+        schedule()
+
+def get_expiry(url):
+    """When a CDN link stops working, from its ex parameter (hex timestamp)"""
+    query = parse_qs(urlparse(url).query)
+    
+    try:
+        return int(query["ex"][0], 16)
+        
+    except (KeyError, ValueError):
+        return time.time() + URL_TTL
+
+def save_urls(message, uploads):
+    """Save the links of the files sent in a message
+    uploads = file name -> path of the file"""
+    if urls is None:
+        load_urls()
+        
+    changed = False
+    
+    for file in message.attachments:
+        if not file.filename in uploads:
+            continue
+            
+        key = hashes.get(get_path(uploads[file.filename]))
+        
+        if key is None:
+            continue
+            
+        urls[key] = {"url": file.url, "expires": get_expiry(file.url), "message": message.id, "channel": message.channel.id}
+        checked[key] = time.time()
+        
+        stats["uploads"] += 1
+        changed = True
+        
+    if changed:
+        schedule()
+
+def schedule():
+    global save_handle
+    
+    if save_handle is not None:
+        return
+        
+    try:
+        loop = asyncio.get_running_loop()
+        
+    except RuntimeError:
+        save()
+        
+        return
+        
+    save_handle = loop.call_later(SAVE_DELAY, save)
+
+def save():
+    global save_handle
+    
+    if save_handle is not None:
+        save_handle.cancel()
+        save_handle = None
+        
+    if urls is None:
+        return
+        
+    now = time.time()
+    data = {key: value for key, value in urls.items() if is_valid(value, now)}
+    
+    os.makedirs(os.path.dirname(URL_FILE), exist_ok=True)
+    
+    # written to another file first so a crash doesn't leave half of it
+    with open(URL_FILE + ".tmp", "w") as f:
+        json.dump(data, f)
+        
+    os.replace(URL_FILE + ".tmp", URL_FILE)
+
+atexit.register(save)
+
+def clear():
+    global size
+    
+    data.clear()
+    size = 0
+
+def get_stats():
+    return {**stats, "files": len(data), "bytes": size, "indexed": len(files or {}), "saved": len(urls or {})}
@@ -1,14 +1,22 @@
 import discord
 import asyncio
+import traceback
+import contextlib
 from discord.app_commands import Group, Command
 
 from maji.context import MajiContext
+import maji.attachment as attachment
 
 from client import client
 
 
 DEFAULT_COMMAND = ["o!", "O!"]
 
+# Max commands running at the same time, for everyone and for each user
+# a command waiting for a button/menu gives its slot back until it's used (Commands.idle)
+MAX_TASKS = 64
+MAX_USER_TASKS = 3
+
 
 class Classic:
     """One classic command via text"""
@@ -37,11 +45,29 @@ class Commands:
         
         self.classic_data = {}
         
+        # lowercase name/alias -> Classic
+        self.classic_names = {}
+        
+        # first characters of the prefixes, to skip messages that can't be commands
+        self.prefix_start = set()
+        self.prefix_key = ()
+        
         self.slash_payload = {}
         self.slash_func = {}
         
+        # full path (group, subgroup, name) -> function
+        self.slash_routes = {}
+        
         self.background = set()
         
+        self.semaphore = asyncio.Semaphore(MAX_TASKS)
+        
+        # user id -> [semaphore, commands using it]
+        self.users = {}
+        
+        self.waiting = 0
+        self.running = 0
+        
     ###############################################
     ## Classic commands
     ###############################################
@@ -50,10 +76,43 @@ class Commands:
         """Classic commands via text"""
         classic = Classic(name, function, alias=alias)
         
+        replaced = name in self.classic_data
+        
         self.classic_data[name] = classic
         
+        # the first command with a name is the one used
+        if replaced:
+            self.classic_names = {}
+            
+            for value in self.classic_data.values():
+                self.add_classic_names(value)
+                
+        else:
+            self.add_classic_names(classic)
+        
         return classic
         
+    def add_classic_names(self, classic) -> None:
+        for x in [classic.name] + classic.alias:
+            if not x in self.classic_names:
+                self.classic_names[x] = classic
+                
+    def get_prefix(self, msg):
+        """Prefix the message starts with, None if it's not a command"""
+        # the bot's ping is added to the prefixes later
+        if self.prefix_key != tuple(self.prefix):
+            self.prefix_key = tuple(self.prefix)
+            self.prefix_start = set(x[0] for x in self.prefix if x)
+            
+        if not msg or not msg[0] in self.prefix_start:
+            return None
+            
+        for prefix in self.prefix:
+            if msg.startswith(prefix):
+                return prefix
+                
+        return None
+        
     def classic(self, name, **kwargs):
         """Decorator for classic commands"""
         
@@ -71,31 +130,31 @@ class Commands:
 
         msg = ctx.content.strip()
         
-        for prefix in self.prefix:
-            if msg.startswith(prefix):
-                msg = msg[len(prefix):]
-                
-                msg = msg.split(" ", 1)
-                
-                command_check = msg[0].strip()
-                
-                if len(msg) == 1:
-                    msg = ""
-                    
-                else:
-                    msg = msg[1].strip()
-                
-                for key, value in self.classic_data.items():
-                    if value.check(command_check):
-                        ctx.content = msg
-                        
-                        maji_context = MajiContext(ctx)
-                        
-                        await self.task(value.summon, maji_context)
-                        
-                        break
-                
-                break
+        prefix = self.get_prefix(msg)
+        
+        if prefix is None:
+            return
+            
+        msg = msg[len(prefix):]
+        
+        msg = msg.split(" ", 1)
+        
+        command_check = msg[0].strip()
+        
+        if len(msg) == 1:
+            msg = ""
+            
+        else:
+            msg = msg[1].strip()
+            
+        value = self.classic_names.get(command_check.lower())
+        
+        if value is not None:
+            ctx.content = msg
+            
+            maji_context = MajiContext(ctx)
+            
+            await self.task(value.summon, maji_context)
     
     ###############################################
     ## Slash commands
@@ -159,6 +218,9 @@ class Commands:
         
         func_to[name] = func
         
+        path = tuple(x for x in [group, subgroup, name] if x)
+        self.slash_routes[path] = func
+        
         return add_to[name]
     
     def slash(self, name, *args, **kwargs):
@@ -172,16 +234,15 @@ class Commands:
         return wrapper
         
     async def check_slash(self, interaction) -> None: 
-        def check(data, funcs):
-            func = funcs[data["name"]]
-            
-            if isinstance(func, dict):
-                return check(data["options"][0], func)
-                
-            else:
-                return func, data
+        data = interaction.data
+        path = (data["name"],)
         
-        func, data = check(interaction.data, self.slash_func)
+        # groups have the subcommand as their first option
+        while not path in self.slash_routes:
+            data = data["options"][0]
+            path += (data["name"],)
+            
+        func = self.slash_routes[path]
         
         options = {}
         
@@ -193,14 +254,113 @@ class Commands:
         
         await self.task(func, context, options)
     
-    async def task(self, func, *args, **kwargs):
-        await func(*args, **kwargs)
-    
-        #task = asyncio.create_task(func(*args, **kwargs))
+    async def task(self, func, ctx, *args, **kwargs):
+        """Run command in the background, so the event doesn't wait for it"""
+        task = asyncio.create_task(self.run_task(func, ctx, *args, **kwargs))
+        
+        self.background.add(task)
+        
+        task.add_done_callback(self.background.discard)
+        
+    async def run_task(self, func, ctx, *args, **kwargs):
+        user = ctx.author.id
         
-        #self.background.add(task)
+        if not user in self.users:
+            self.users[user] = [asyncio.Semaphore(MAX_USER_TASKS), 0]
+            
+        self.users[user][1] += 1
+        
+        try:
+            # slash commands need an answer in 3 seconds, that might not be enough to get a slot
+            if ctx.interaction and self.is_full(ctx):
+                await ctx.defer()
+                
+            await self.acquire(ctx)
+            
+            await func(ctx, *args, **kwargs)
+            
+        except asyncio.CancelledError:
+            raise
+            
+        except Exception:
+            traceback.print_exc()
+            
+        finally:
+            self.release(ctx)
+            
+            self.users[user][1] -= 1
+            
+            if self.users[user][1] == 0:
+                self.users.pop(user)
+                
+    def is_full(self, ctx) -> bool:
+        return self.users[ctx.author.id][0].locked() or self.semaphore.locked()
         
-        #task.add_done_callback(self.background.discard)
+    async def acquire(self, ctx) -> None:
+        """Waits for a slot of the user and then a global one"""
+        semaphore = self.users[ctx.author.id][0]
+        
+        self.waiting += 1
+        
+        try:
+            await semaphore.acquire()
+            
+            try:
+                await self.semaphore.acquire()
+                
+            except BaseException:
+                semaphore.release()
+                raise
+                
+        finally:
+            self.waiting -= 1
+            
+        ctx.holding = True
+        self.running += 1
+        
+    def release(self, ctx) -> None:
+        if not ctx.holding:
+            return
+            
+        ctx.holding = False
+        self.running -= 1
+        
+        self.semaphore.release()
+        self.users[ctx.author.id][0].release()
+        
+    @contextlib.asynccontextmanager
+    async def idle(self, ctx, resume = True):
+        """Gives the slots of the command back while it waits for someone to use a button/menu
+        resume = False if the command ends after waiting, so it doesn't take them again"""
+        holding = getattr(ctx, "holding", False)
+        
+        if holding:
+            self.release(ctx)
+            
+        yield
+        
+        if holding and resume:
+            await self.acquire(ctx)
+            
+    def get_stats(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "running": self.running,
+            "users": len(self.users)
+        }
+        
+    def messages_deleted(self, ids) -> None:
+        """Links to the files of the messages stop working"""
+        attachment.drop_messages(ids)
+        
+    async def close(self) -> None:
+        """Cancel every command still running, except the one calling this"""
+        tasks = [x for x in self.background if x is not asyncio.current_task()]
+        
+        for task in tasks:
+            task.cancel()
+            
+        await asyncio.gather(*tasks, return_exceptions=True)
     
     async def sync(self, guild = None) -> dict:
         payload = []
@@ -36,7 +36,26 @@ class MajiContext:
         
         self.view_sent = False
         
+        # answered with defer, the first message is a followup
+        self.deferred = False
+        
+        # if it has the slots of Commands.run_task
+        self.holding = False
+        
+    async def defer(self) -> None:
+        """Lets discord know the answer is coming, interactions need one in 3 seconds"""
+        # picked from a menu, the message gets edited after
+        if isinstance(self.interaction, discord.Interaction):
+            if not self.interaction.response.is_done():
+                await self.interaction.response.defer()
+                
+        elif self.interaction and not self.sent and not self.src.response.is_done():
+            await self.src.response.defer()
+            
+            self.deferred = True
+        
     async def send(self, *args, **kwargs):
+        """Returns the message, or None if it's not known (edited by an interaction response)"""
         if "interaction" in kwargs:
             if not kwargs["interaction"] is None:
                 interaction = kwargs["interaction"]
@@ -63,8 +82,18 @@ class MajiContext:
         # need the new interaction to properly work
         if interaction:
             if not self.sent:
-                await self.src.response.send_message(*args, **kwargs)
-                self.sent = await self.src.original_response()
+                if self.deferred:
+                    # followups can't be deleted by discord, so it's done here
+                    delete_after = kwargs.pop("delete_after", None)
+                    
+                    self.sent = await self.src.followup.send(*args, wait=True, **kwargs)
+                    
+                    if delete_after is not None:
+                        await self.sent.delete(delay=delete_after)
+                        
+                else:
+                    await self.src.response.send_message(*args, **kwargs)
+                    self.sent = await self.src.original_response()
                 
             else:
                 if "files" in kwargs:
@@ -74,8 +103,10 @@ class MajiContext:
                 if isinstance(interaction, discord.Interaction) and not interaction.response.is_done():
                     await interaction.response.edit_message(*args, **kwargs)
                     
+                    return None
+                    
                 else:
-                    await self.sent.edit(*args, **kwargs)
+                    self.sent = await self.sent.edit(*args, **kwargs)
             
         else:
             if not self.sent:
@@ -87,4 +118,6 @@ class MajiContext:
                     kwargs["attachments"] = kwargs["files"]
                     kwargs.pop("files")
                     
-                await self.sent.edit(*args, **kwargs)
\ No newline at end of file
+                self.sent = await self.sent.edit(*args, **kwargs)
+                
+        return self.sent
\ No newline at end of file
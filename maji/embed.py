@@ -1,5 +1,5 @@
 import discord
-import os
+import maji.attachment as attachment
 
 default_color = 0x2570c2
 
@@ -18,6 +18,11 @@ class Embed(discord.Embed):
         super().__init__()
         
         self.files = []
+        # file name -> path, to save their links after sending
+        self.uploads = {}
+        
+        # key -> url of every image set, links and attachments
+        self.images = {}
         
         if "color" not in kwargs: kwargs["color"] = default_color
         
@@ -32,6 +37,8 @@ class Embed(discord.Embed):
         Attachments need to use Embed.attach"""
         
         def check_attachment(k, v):
+            self.images[k] = v
+            
             if "attachment://" in v:
                 self.attach_keys[k] = v
         
@@ -101,34 +108,60 @@ class Embed(discord.Embed):
         # If image is a file instead of a link
         if not "https://" in file_path:
             # check if file exists
-            if not file_path or not os.path.isfile(file_path):
+            if not file_path or not attachment.exists(file_path):
                 return
             
+            # smaller version made for this key, if there's one
+            source = file_path
+            file_path = attachment.get_variant(file_path, key)
+            
             file_type = ""
             
             if "." in file_path:
                 file_type = file_path.split(".")[-1]
             
             file_name = f"{key}.{file_type}"
-            file = discord.File(file_path, filename=file_name)
+            url = attachment.get_url(file_path)
+            
+            # already uploaded before
+            if url:
+                self.set(key, url)
+                return
+            
+            file = attachment.get_file(file_path, file_name)
+            
+            # the variant was removed, use the original
+            if file is None and source != file_path:
+                file_path = source
+                file = attachment.get_file(file_path, file_name)
+                
+            if file is None:
+                return
             
             self.files.append(file)
+            self.uploads[file_name] = file_path
             
             file_path = f"attachment://{file_name}"
             
         self.set(key, file_path)
         
     def infobox(self, infobox) -> None:
-        for key, value in infobox.settings.items():
+        """Infobox as a dict with settings, fields and images"""
+        for key, value in infobox["settings"].items():
             self.set(key, value)
             
-        for key in infobox.fields:
-            field = infobox.fields[key]
+        for field in infobox["fields"]:
+            self.add_field(name=field["name"], value=field["value"], inline=field["inline"])
             
-            self.add_field(name=field.name, value=field.value, inline=field.inline)
-            
-        for key, value in infobox.images.items():
+        for key, value in infobox["images"].items():
             self.attach(key, value)
             
     async def send(self, ctx, **kwargs) -> None:
-        await ctx.send(embed=self, files=self.files, **kwargs)
\ No newline at end of file
+        message = await ctx.send(embed=self, files=self.files, **kwargs)
+        
+        self.save_uploads(message, **kwargs)
+        
+    def save_uploads(self, message, **kwargs) -> None:
+        """Save the links of the uploaded files, messages that get deleted take them with them"""
+        if message and self.uploads and not "delete_after" in kwargs and not kwargs.get("ephemeral"):
+            attachment.save_urls(message, self.uploads)
\ No newline at end of file
@@ -1,4 +1,6 @@
 import discord
+import maji.attachment as attachment
+from maji.commands import commands
 from maji.embed import Embed
 
 
@@ -105,6 +107,9 @@ class MultiEmbed:
         # bool
         self.first_page_sent = False
         
+        # file name -> path of the files in the message
+        self.attached = {}
+        
         self.owner = None
     
     def append(self, page, index = None) -> int:
@@ -142,7 +147,9 @@ class MultiEmbed:
         
         await self.update(interaction)
         
-        await self.view.wait()
+        # nothing left to run after the buttons stop
+        async with commands.idle(ctx, resume = False):
+            await self.view.wait()
         
         # edit message now with all buttons disabled
         for component in self.view.children:
@@ -171,32 +178,80 @@ class MultiEmbed:
                     self.view.remove_item(component)
         
         if self.first_page_sent:
-            # For some reason it gives a error if you respond without the new interaction
-            await self.ctx.send(embed=embed, view=self.view, interaction=interaction)
+            files = self.get_files(embed, interaction)
             
+            # For some reason it gives a error if you respond without the new interaction
+            if files is None:
+                await self.ctx.send(embed=embed, view=self.view, interaction=interaction)
+                
+            else:
+                await self.ctx.send(embed=embed, view=self.view, files=files, interaction=interaction)
+                
         else:
-            # Change all other pages to have the same attachments in the same place
+            # Pages without their own image keep showing the one of the first page
             for i, page in self.pages.items():
                 if page != embed:
-                    for x, y in embed.attach_keys.items():
-                        page.set(x, y)
-                
-            # Only send files for the first embed
-            await self.ctx.send(embed=embed, view=self.view, files=embed.files, interaction=interaction)
+                    self.inherit(embed, page)
+                    
+            # Only the files of the first page, other pages upload theirs when they're shown
+            message = await self.ctx.send(embed=embed, view=self.view, files=embed.files, interaction=interaction)
+            
+            embed.save_uploads(message)
             
+            self.attached = embed.uploads.copy()
             self.first_page_sent = True
             
+    def inherit(self, embed, page) -> None:
+        for key, value in embed.images.items():
+            if key in page.images:
+                continue
+                
+            page.set(key, value)
+            
+            name = value.split("attachment://", 1)[-1]
+            
+            if name in embed.uploads:
+                page.uploads[name] = embed.uploads[name]
+                
+    def get_files(self, embed, interaction = None):
+        """Attachments the message needs to show the page, None if it already has them
+        Files already in the message are kept instead of uploading them again"""
+        if embed.uploads == self.attached:
+            return None
+            
+        message = interaction.message if interaction and interaction.message else self.ctx.sent
+        current = {x.filename: x for x in message.attachments} if message else {}
+        
+        result = []
+        kept = set()
+        
+        for name, path in embed.uploads.items():
+            if self.attached.get(name) == path and name in current:
+                result.append(current[name])
+                kept.add(name)
+                
+            else:
+                # the files of the page can only be sent once
+                file = attachment.get_file(path, name)
+                
+                if file is not None:
+                    result.append(file)
+                    
+        # files taken out of the message lose their links
+        if message and any(not x in kept for x in current):
+            attachment.drop_messages([message.id])
+            
+        self.attached = embed.uploads.copy()
+        
+        return result
+        
     def pagebox(self, pagebox):
-        for i, infobox in pagebox.pages.items():
+        """Pagebox as a dict with pages (infoboxes) and buttons"""
+        for infobox in pagebox["pages"]:
             embed = Embed()
             embed.infobox(infobox)
             
             self.append(embed)
             
-        for i, tbl in pagebox.buttons.items():
-            show = []
-            
-            for _, v in tbl.show.items():
-                show.append(v)
-
-            self.button(page=tbl.page, section=tbl.section, show=show, label=tbl.label, emoji=tbl.emoji, color=tbl.color)
\ No newline at end of file
+        for tbl in pagebox["buttons"]:
+            self.button(page=tbl["page"], section=tbl["section"], show=tbl["show"], label=tbl.get("label"), emoji=tbl["emoji"], color=tbl["color"])
\ No newline at end of file
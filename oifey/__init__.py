@@ -1,7 +1,9 @@
 import oifey.module as module
+import oifey.pool as pool
 import oifey.util as util
 import oifey.sql as sql
 import oifey.alias as alias
+import oifey.worker as worker
 
 modules = module.modules
 user = sql.user
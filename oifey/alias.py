@@ -1,4 +1,6 @@
-import maji
+import maji, re, asyncio
+
+from collections import OrderedDict
 
 import oifey.sql as sql
 import oifey.util as util
@@ -12,18 +14,142 @@ character_max = 30
 
 alias_limit = 30
 
-# ADD
-async def add_alias(ctx, table, name, og, alias):
-    row = table.get(name)
-    if not "alias" in row: row["alias"] = []
+class AliasMatcher:
+    """Aliases of a user and then their server
+    They're tried in that order, each one replaces the first match that isn't part of an alias replaced before it.
+    When both have the same alias, the user's replaces the first match and the server's the next one.
+    Text that was replaced isn't checked again by the rest"""
+    def __init__(self, aliases):
+        # [(regex, alias, original)] in order
+        self.aliases = []
+        
+        regexes = {}
+        options = []
+        
+        for value in aliases:
+            alias = value["alias"]["clean"]
+            
+            # find alias that is between whitespace or/and
+            # has 0-2 numbers in the end
+            if not alias in regexes:
+                regexes[alias] = re.compile(r"\b" + re.escape(alias) + r"\d{0,2}\b")
+                
+                options.append(re.escape(alias))
+                
+            self.aliases.append((regexes[alias], alias, value["og"]["clean"]))
+        
+        # all of them in one, to skip text without any alias in one pass
+        if options:
+            self.regex = re.compile(r"\b(?:" + "|".join(options) + r")\d{0,2}\b")
+            
+        else:
+            self.regex = None
+            
+    def has_aliases(self) -> bool:
+        return self.regex is not None
+        
+    def replace(self, text) -> str:
+        if self.regex is None or not self.regex.search(text):
+            return text
+            
+        # (start, end, new text)
+        found = []
+        
+        def is_free(start, end):
+            for x in found:
+                if start < x[1] and x[0] < end:
+                    return False
+                    
+            return True
+            
+        for regex, alias, original in self.aliases:
+            for match in regex.finditer(text):
+                start, end = match.span()
+                
+                if is_free(start, end):
+                    # keep the numbers at the end
+                    found.append((start, end, original + text[start + len(alias):end]))
+                    break
+                    
+        found.sort()
+        
+        result = []
+        i = 0
+        
+        for start, end, new in found:
+            result.append(text[i:start])
+            result.append(new)
+            
+            i = end
+            
+        result.append(text[i:])
+        
+        return "".join(result)
+
+# (user id, server id) -> AliasMatcher, least recently used first
+matchers = OrderedDict()
+
+matcher_limit = 4096
+
+empty = AliasMatcher([])
 
-    if len(row["alias"]) >= alias_limit:
-        embed = maji.Embed(title = "Alias limit reached!", desc = "Maybe try removing old ones?", color = embed_color)
+# changes every time a matcher is cleared
+cleared = 0
+
+def get_key(ctx) -> tuple:
+    return (ctx.author.id, ctx.guild.id if ctx.guild else None)
+
+def get_matcher(ctx) -> AliasMatcher:
+    """Matcher of the user's aliases and then the server's
+    Only what load_matcher already got, empty if it wasn't loaded"""
+    key = get_key(ctx)
+    
+    if not key in matchers:
+        return empty
         
-        await ctx.send(embed=embed)
+    matchers.move_to_end(key)
+    
+    return matchers[key]
+    
+async def load_matcher(ctx) -> AliasMatcher:
+    """Reads the aliases from the database if they aren't in memory
+    Needs to be awaited before searching, so the search doesn't wait for the database"""
+    key = get_key(ctx)
+    
+    while not key in matchers:
+        # aliases changed while reading, read them again
+        version = cleared
         
-        return
+        aliases = await sql.aliases.get_async(sql.user, ctx.author.id)
+        
+        if ctx.guild:
+            aliases = aliases + await sql.aliases.get_async(sql.server, ctx.guild.id)
+            
+        if version != cleared:
+            continue
+            
+        matchers[key] = AliasMatcher(aliases)
+        
+        if len(matchers) > matcher_limit:
+            matchers.popitem(last=False)
+            
+        return matchers[key]
+        
+    return get_matcher(ctx)
     
+def clear_matcher(table, name) -> None:
+    """Removes every matcher that has the aliases of the row"""
+    global cleared
+    
+    cleared += 1
+    
+    i = 0 if table.key == sql.user.key else 1
+    
+    for key in [x for x in matchers if x[i] == name]:
+        matchers.pop(key)
+
+# ADD
+async def add_alias(ctx, table, name, og, alias):
     def remove(data):
         for x in sql.banned_words:
             data = data.replace(x, "")
@@ -45,9 +171,25 @@ async def add_alias(ctx, table, name, og, alias):
             "alias": {"clean": search_text(alias, ignore_space = True), "display": alias},
         }
         
-        row["alias"].append(add)
-        
-        table.update(name, row)
+        # the limit is checked with the insert, so commands at the same time can't go over it
+        try:
+            added = await asyncio.wrap_future(sql.aliases.add(table, name, add, alias_limit))
+            
+        except Exception as e:
+            print("Couldn't add alias:", repr(e))
+            
+            await ctx.send(embed=save_error())
+            
+            return
+            
+        if not added:
+            embed = maji.Embed(title = "Alias limit reached!", desc = "Maybe try removing old ones?", color = embed_color)
+            
+            await ctx.send(embed=embed)
+            
+            return
+            
+        clear_matcher(table, name)
         
         embed = maji.Embed(title = "Success", desc = "Alias added!", color = embed_color)
         await ctx.send(embed=embed)
@@ -59,8 +201,7 @@ async def add_alias(ctx, table, name, og, alias):
       
 # SHOW
 async def show_alias(ctx, table, name):
-    row = table.get(name)
-    row = row.get("alias") or []
+    row = await sql.aliases.get_async(table, name)
     
     if not row:
         embed = maji.Embed(title = "No aliases yet!", desc = "There's still no aliases here.\nIf you're looking at adding alias for yourself, use /alias user.\nIf you're looking at adding aliases for a server, only people that can manage messages can add/remove them, with the command being /alias server.", color = embed_color)
@@ -85,17 +226,20 @@ async def show_alias(ctx, table, name):
 
 # REMOVE  
 async def remove_alias(ctx, table, name, index = 0):
-    row = table.get(name)
-    if not "alias" in row: row["alias"] = []
-    
-    alias = row["alias"]
-    
     index = max(index - 1, 0)
     
-    if alias and index < len(alias):
-        alias.pop(index)
+    try:
+        removed = await asyncio.wrap_future(sql.aliases.remove(table, name, index))
         
-        table.update(name, row)
+    except Exception as e:
+        print("Couldn't remove alias:", repr(e))
+        
+        await ctx.send(embed=save_error())
+        
+        return
+        
+    if removed:
+        clear_matcher(table, name)
         
         embed = maji.Embed(title = "Success", desc = "Alias removed!", color = embed_color)
         
@@ -106,6 +250,9 @@ async def remove_alias(ctx, table, name, index = 0):
         
         await ctx.send(embed=embed)
     
+def save_error():
+    return maji.Embed(title = "Error", desc = "The aliases couldn't be saved, please try again later.", color = embed_color)
+    
 # Command funcs
 # user
 async def user_add(ctx, options = {}):
@@ -1,9 +1,12 @@
-import maji
+import maji, time, json
 import oifey.util as util
 
+from collections import OrderedDict
+
 from oifey.check import key_to_check, LevelCheck, EntryCheck
 from oifey.pool import get_pool, SearchResult, mix_pool
-from lua import almanac, lua, to_table
+import oifey.worker as worker
+import oifey.alias as alias
 
 DEFAULT_KEYS = ["-", "--", "~~", "~"]
 
@@ -27,6 +30,51 @@ common_pars = {
     "maddening": ["mm", "maddeningmode"]
 }
 
+# Finished infoboxes/pageboxes, so the same command with the same options
+# doesn't need to run the workspace again
+CACHE_SIZE = 512
+# seconds
+CACHE_TTL = 60 * 30
+
+class RenderCache:
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        
+        # key -> (time added, box)
+        self.data = OrderedDict()
+        
+        self.hits = 0
+        self.misses = 0
+        
+    def get(self, key):
+        if key in self.data:
+            added, box = self.data[key]
+            
+            if time.monotonic() - added < self.ttl:
+                self.data.move_to_end(key)
+                self.hits += 1
+                
+                return box
+                
+            self.data.pop(key)
+            
+        self.misses += 1
+        
+        return None
+        
+    def set(self, key, box):
+        self.data[key] = (time.monotonic(), box)
+        self.data.move_to_end(key)
+        
+        while len(self.data) > self.size:
+            self.data.popitem(last=False)
+            
+    def clear(self):
+        self.data.clear()
+
+render_cache = RenderCache(CACHE_SIZE, CACHE_TTL)
+
 class PickEntry:
     def __init__(self, options, key, search):
         self.options = options
@@ -41,11 +89,8 @@ class Command:
         # id and command name
         self.name = name
 
-        # lua table to summon
-        self.table = almanac.game
-
-        for key in data["lua"]:
-            self.table = self.table[key]
+        # lua table to summon, the game is only loaded when it's used
+        self.lua = data["lua"]
 
         self.main = get_pool(data["main"])
 
@@ -130,6 +175,16 @@ class Command:
             else:
                 self.par[key] = value
         
+        # slash option key -> parameters, for the keys of the slash command
+        self.routes = {}
+        
+        for key in [par.key for par in self.parameters] + ([self.comma["name"]] if self.comma else []):
+            self.get_routes(key)
+            
+        # made on the first classic command, the alt names can still change while modules load
+        self.valid_value = None
+        self.par_alt = None
+        
         # slash command = game_name [group] + command_name
         if not data.get("NO_SLASH"):
             maji.commands.add_slash(self.slash_callback, 
@@ -149,6 +204,34 @@ class Command:
     def has_classic(self):
         return True
         
+    def get_table(self):
+        return worker.get_table(self.lua)
+        
+    def get_routes(self, key):
+        """Parameters that use a slash option key, the same key always goes to the same ones"""
+        if key in self.routes:
+            return self.routes[key]
+            
+        result = [par for par in self.parameters if par.check_key(key)]
+        
+        # classic commands can send any key, only keep the ones that go somewhere
+        if result:
+            self.routes[key] = result
+            
+        return result
+        
+    def get_alt(self, key):
+        """Main key of an alt parameter name, the first one that has it"""
+        if self.par_alt is None:
+            self.par_alt = {}
+            
+            for x, y in self.par.items():
+                for alt in y:
+                    if not alt in self.par_alt:
+                        self.par_alt[alt] = x
+                        
+        return self.par_alt.get(key, key)
+        
     def get_parameter(self, name):
         for par in self.parameters:
             if par.key == name:
@@ -162,6 +245,8 @@ class Command:
             
             return
             
+        await alias.load_matcher(ctx)
+        
         options, word = await self.find_entry(ctx)
         
         if options is None:
@@ -169,6 +254,65 @@ class Command:
             
         await self.callback_organize(ctx, options, word)
         
+    def split_entry(self, msg, options):
+        """Words to search, the exclamation is moved to the options"""
+        if self.exclamation and "!" in msg and msg[0] != "!":
+            exclamation, msg = [x.strip() for x in msg.split("!", 1)]
+            
+            if exclamation:
+                options["EXCLAMATION"] = exclamation
+
+        return util.text.splice_spaces(msg)
+        
+    async def find_comma(self, ctx, value):
+        """Options of every unit to compare, None if one of them isn't valid
+        Every name is searched before asking to pick any of them, and the same name is only searched once"""
+        searches = {}
+        units = []
+        
+        for x in value[:self.comma["size"] - 1]:
+            options = {}
+            msg = self.split_entry(x.strip(), options)
+            key = tuple(msg)
+            
+            if not key in searches:
+                searches[key] = self.main.search_list(msg, ctx)
+                
+            lsr = searches[key]
+            
+            if not lsr.is_found():
+                await self.parent.entry_error(ctx, self.name, lsr.invalid_word)
+                return None
+                
+            # changed later if there's more than one
+            options["name"] = lsr.search.get_result().id
+            
+            options, words = self.parse_parameters(ctx, options, list(lsr.invalid_word))
+            options, pick_entries = await self.parse_slash(ctx, options)
+            
+            if options is None:
+                return None
+                
+            units.append((options, lsr.search, pick_entries))
+        
+        result = []
+        
+        # repeated names share the search, so they're only picked once
+        for options, sr, pick_entries in units:
+            if sr.is_multiple():
+                await sr.pick_result(ctx)
+                
+            options["name"] = sr.get_result().id
+            
+            for pick in pick_entries:
+                await pick.search.pick_result(ctx)
+                
+                pick.options[pick.key] = pick.search.get_result().id
+                
+            result.append(self.get_options(options))
+            
+        return result
+        
     async def find_entry(self, ctx, content = None) -> None:
         if content is None:
             content = ctx.content
@@ -187,13 +331,7 @@ class Command:
             if comma:
                 options["COMMA"] = comma
                 
-        if self.exclamation and "!" in msg and msg[0] != "!":
-            exclamation, msg = [x.strip() for x in msg.split("!", 1)]
-            
-            if exclamation:
-                options["EXCLAMATION"] = exclamation
-
-        msg = util.text.splice_spaces(msg)
+        msg = self.split_entry(msg, options)
         lsr = self.main.search_list(msg, ctx)
         
         if lsr.is_found():
@@ -224,7 +362,10 @@ class Command:
         await self.slash_callback(ctx, options)
         
     def parse_parameters(self, ctx, options, words):
-        result, words = util.text.get_parameters(words, self.parameters, self.start_keys)
+        if self.valid_value is None:
+            self.valid_value = util.text.get_valid_value(self.parameters)
+            
+        result, words = util.text.get_parameters(words, self.parameters, self.start_keys, self.valid_value)
         
         # Personal thing
         for x in ["base", "personal"]:
@@ -237,21 +378,17 @@ class Command:
         # Check parameters
         for value in result:
             # Replace Alt Result keys with the "main" ones
-            for x, y in self.par.items():
-                if value.key in y:
-                    value.key = x
+            value.key = self.get_alt(value.key)
+            
+            par = None
+            
+            # only the parameters that can use the key, the options can still make them skip it
+            for x in self.get_routes(value.key):
+                # if the parameter key is not the same, and it's not using the correct prefix
+                if x.check_key(value.key, options) and (not(x.key in self.prefix) or 
+                (x.key != value.key and self.prefix[x.key] == value.start)):
+                    par = x
                     break
-                    
-            def do_thing():
-                for par in self.parameters:
-                    # if the parameter key is not the same, and it's not using the correct prefix
-                    if par.check_key(value.key, options) and (not(par.key in self.prefix) or 
-                    (par.key != value.key and self.prefix[par.key] == value.start)):
-                        return par
-
-                return None
-
-            par = do_thing()
             
             if not par is None:
                 # key, value = par.get_classic(value)
@@ -270,50 +407,32 @@ class Command:
         if self.level:
             result = []
             
-            while len(words) > 0:
-                found = False
-                
-                def check(i):
-                    try:
-                        return int(i)
-                        
-                    except ValueError:
-                        return None
-                
-                index = -1
-                
-                for word in words:
-                    index += 1
+            rest = []
+            
+            def check(i):
+                try:
+                    return int(i)
                     
-                    if "/" in word:
-                        word = [x.strip() for x in word.split("/")]
-                        while "" in word: word.remove("")
-                        
-                        popped = False
-                        
-                        for x in word:
-                            find = check(x)
-
-                            if find is not None:
-                                result.append(find)
-                                found = True
-                                
-                                if not popped:
-                                    words.pop(index)
-                                    popped = True
-                        
-                    else:
-                        find = check(word)
-                        
-                        if find is not None:
-                            result.append(find)
-                            found = True
-                            words.pop(index)
+                except ValueError:
+                    return None
+            
+            # numbers are taken in order, "20/10" counts as both
+            for word in words:
+                if "/" in word:
+                    find = [check(x.strip()) for x in word.split("/") if x.strip()]
+                    find = [x for x in find if x is not None]
+                    
+                else:
+                    find = check(word)
+                    find = [] if find is None else [find]
                     
-                    if found: break
+                if find:
+                    result += find
                     
-                if not found:
-                    break
+                else:
+                    rest.append(word)
+                    
+            words[:] = rest
             
             if len(result) > 0:
                 options["level"] = result
@@ -366,13 +485,12 @@ class Command:
         for key in options.keys():
             value = options[key]
 
-            for par in self.parameters:
-                if par.check_key(key):
-                    if isinstance(par, EntryCheck):
-                        par.get_slash(value, options, ctx)
-                        
-                    else:
-                        par.get_slash(value, options)
+            for par in self.get_routes(key):
+                if isinstance(par, EntryCheck):
+                    par.get_slash(value, options, ctx)
+                    
+                else:
+                    par.get_slash(value, options)
                         
         # Averages = Last class needs to be in the class key, everything else in job_averages
         if "class" in options and isinstance(options["class"], list):
@@ -428,6 +546,9 @@ class Command:
         return options, pick_entry
         
     async def slash_callback(self, ctx, options = {}) -> None:
+        # searches only use the aliases that are already in memory
+        await alias.load_matcher(ctx)
+        
         options, pick_entries = await self.parse_slash(ctx, options)
         
         if options is None:
@@ -440,31 +561,12 @@ class Command:
             
             if isinstance(value, str):
                 value = [x.strip() for x in value.split(",")]
-                while "" in value: comma.remove("")
+                while "" in value: value.remove("")
                 
-            result = []
-            value = value[:self.comma["size"] - 1]
+            result = await self.find_comma(ctx, value)
             
-            for x in value:
-                new_options, new_words = await self.find_entry(ctx, x)
-                
-                if new_options is None:
-                    return
-                
-                new_options, new_words = self.parse_parameters(ctx, new_options, new_words)
-                
-                new_options, new_pick = await self.parse_slash(ctx, new_options)
-                
-                if new_options is None:
-                    return
-                
-                for pick in new_pick:
-                    await pick.search.pick_result(ctx)
-                    
-                    pick.options[pick.key] = pick.search.get_result().id
-                
-                table = self.summon(new_options)
-                result.append(table)
+            if result is None:
+                return
                 
             if len(result) > 0:
                 options[comma] = result
@@ -482,52 +584,74 @@ class Command:
             else:
                 options["context"] = "Kiran"
             
-        # Summon table here
-        table = self.summon(options)
-        infobox = table.show(table)
+        options = self.get_options(options)
+        
+        # context changes the result, so those aren't saved
+        key = None if self.pass_context else self.get_cache_key(options)
+        
+        infobox = render_cache.get(key) if key else None
+        
+        # Summon table here, the workspace is run by the workers
+        if infobox is None:
+            # the workers might have to wait for a spot, or a restart
+            await ctx.defer()
+            
+            infobox = await worker.run(self.lua, options, self.comma["name"] if self.comma else None)
+        
+            def set_color(box):
+                if self.color and not box["settings"].get("color"):
+                    box["settings"]["color"] = self.color
 
-        def set_color(box):
-            if self.color and not box.has_set(box, "color"):
-                box.set(box, "color", self.color)
+            if infobox["has_pages"]:
+                for p in infobox["pages"]:
+                    set_color(p)
+                    
+            else:
+                set_color(infobox)
+            
+            # random results (portraits, fe4 fathers...) need to be different every time
+            if key and not infobox["random"]:
+                render_cache.set(key, infobox)
 
-        if infobox.has_pages:
+        if infobox["has_pages"]:
             embed = maji.MultiEmbed()
-
-            for i, p in infobox.pages.items():
-                set_color(p)
-
             embed.pagebox(infobox)
 
         else:
             embed = maji.Embed()
-
-            set_color(infobox)
             embed.infobox(infobox)
             
         await embed.send(ctx)
 
-    def summon(self, options = {}):
-        """Get the lua table with the options organized and set"""
-        new = options.copy()
-        
+    def get_options(self, options):
+        """Options to send to the workers, search results are replaced by their keys"""
         print(self.parent.name, self.name)
-        table = self.table.new(self.table, new["name"])
-        new.pop("name")
         
-        # filter out empty lists or dicts
-        for key in options.keys():
-            value = options[key]
-
-            if (isinstance(value, list) or isinstance(value, dict)) and not value:
-                options.pop(key)
+        def check(value):
+            if isinstance(value, SearchResult):
+                return value.get_result_key()
                 
-            elif isinstance(value, SearchResult):
-                options[key] = value.get_result_key()
+            elif isinstance(value, list):
+                return [check(x) for x in value]
+                
+            elif isinstance(value, dict):
+                return {k: check(x) for k, x in value.items()}
+                
+            return value
+        
+        return check(options)
 
-        new = to_table(new)
-        table.set_options(table, new)
+    def get_cache_key(self, options):
+        """Game + command + options (with the entry id), None if they can't be used as a key"""
+        try:
+            return (self.parent.name, self.name, json.dumps(options, sort_keys=True))
+            
+        except TypeError:
+            return None
 
-        return table
+    def summon(self, options = {}):
+        """Get the lua table with the options organized and set"""
+        return worker.summon(self.lua, self.get_options(options))
 
     def get_slash_options(self) -> dict:
         game = self.parent.name
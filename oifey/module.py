@@ -4,6 +4,7 @@ import oifey.util as util
 
 from oifey.command import Command
 from oifey.pool import mix_pool, SearchResult
+import oifey.alias as alias
 from lua import almanac
 
 modules = {}
@@ -123,6 +124,8 @@ class Module:
 
         msg = util.text.splice_spaces(msg)
 
+        await alias.load_matcher(ctx)
+
         lsr = self.mix.search_list(msg, ctx)
 
         if lsr.is_found():
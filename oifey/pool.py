@@ -1,19 +1,23 @@
-import os, random, re
+import os, random, bisect, pickle, hashlib
 import oifey.util as util
 import maji
 import discord
 import oifey.sql as sql
+import oifey.alias as alias
 from lua import almanac
 
 
 # add alt names to the lexicon
 lexicon = {}
+lexicon_files = []
 
 if os.path.exists("oifey/lexicon"):
     for root, dirs, files in os.walk("oifey/lexicon"):
         for file_path in files:
             if not file_path.endswith(".json"): continue
             
+            lexicon_files.append(f"{root}/{file_path}")
+            
             file = util.file.json_read(f"{root}/{file_path}")
             
             for key, value in file.items():
@@ -26,6 +30,18 @@ if os.path.exists("oifey/lexicon"):
         
         break
 
+# size of the n-grams used for the substring index
+gram_size = 3
+
+def get_grams(text, size = gram_size) -> set:
+    """Every n-gram of text from 1 up to size characters"""
+    result = set()
+    
+    for n in range(1, size + 1):
+        for i in range(len(text) - n + 1):
+            result.add(text[i:i + n])
+            
+    return result
 
 ###############################
 class Item:
@@ -133,7 +149,8 @@ class SearchResult:
         view.add_item(select)
         await ctx.send(embed=embed, view=view)
         
-        await view.wait()
+        async with maji.commands.idle(ctx):
+            await view.wait()
         
 class ListSearchResult:
     def __init__(self, found, result, found_word, not_word):
@@ -149,6 +166,43 @@ class ListSearchResult:
     def print(self):
         print(self.search, self.text, self.word, self.invalid_word)
 
+class SearchSession:
+    """Searches for a text that keeps growing, like the words of a message
+    Each search only checks the entries found by the last one"""
+    def __init__(self, pool, ctx = None):
+        self.pool = pool
+        self.ctx = ctx
+        
+        self.aliases = pool.get_aliases(ctx)
+        
+        self.text = None
+        self.keys = None
+        
+    def search(self, og_text) -> SearchResult:
+        text = self.pool.get_text(og_text, self.ctx, self.aliases)
+        
+        keys = None
+        
+        # any name that has the new text also has the last one
+        if self.text is not None and text.startswith(self.text):
+            keys = self.keys
+            
+        finds, self.keys = self.pool.find(text, self.ctx, keys)
+        self.text = text
+        
+        return SearchResult(finds, self.pool, og_text)
+        
+    def is_done(self) -> bool:
+        """If searching a longer text can't find anything anymore"""
+        # aliases and trailing pluses can change the start of the text
+        if self.aliases or self.text is None or self.text.endswith("+"):
+            return False
+            
+        elif "random".startswith(self.text):
+            return False
+            
+        return self.keys == [] and not self.pool.has_prefix(self.text)
+
 ##################################
 ## Pool
 
@@ -157,6 +211,8 @@ class Pool:
         self.items = {}
     
     def mix(self, *pools) -> None:
+        self.key = tuple(pool.key for pool in pools)
+        
         for pool in pools:
             
             for key, value in pool.items.items():
@@ -169,12 +225,16 @@ class Pool:
         section = almanac.get(file_path)
         
         self.path = file_path
+        self.key = file_path
         
         for key, value in section.entries.items():
             if not isinstance(key, int): continue
             
             key = value
-            value = section.get(section, value).data
+            
+            # only the fields used for searching, to not read the whole entry
+            value = section.get(section, value)
+            value = value.index(value)
             
             item = Item(self, key, value)
             self.items[key] = item
@@ -186,6 +246,9 @@ class Pool:
         self.hard = {}
         self.alt = {}
         
+        # n-gram -> alt keys that have it, in the same order as self.alt
+        self.grams = {}
+        
         # common function to add hard alt names
         def append_hard(k, v):
             k = util.text.search_text(k)
@@ -207,6 +270,15 @@ class Pool:
             
             if not k in alts:
                 alts.append(k)
+                
+                for gram in get_grams(k):
+                    if not gram in self.grams:
+                        self.grams[gram] = []
+                        
+                    keys = self.grams[gram]
+                    
+                    if not keys or keys[-1] != value.id:
+                        keys.append(value.id)
             
         # Add IDs first
         for key, value in self.items.items():
@@ -231,61 +303,98 @@ class Pool:
                 # try adding as hard alt names
                 append_hard(x, value)
                 
+        self.hard_sorted = sorted(self.hard)
         
     def search(self, og_text, ctx = None) -> SearchResult:
+        text = self.get_text(og_text, ctx, self.get_aliases(ctx))
+        
+        finds, keys = self.find(text, ctx)
+            
+        return SearchResult(finds, self, og_text)
+    
+    def get_aliases(self, ctx = None) -> list:
+        """Alias matcher of the user and the server, empty if there's none"""
+        if not ctx:
+            return []
+            
+        matcher = alias.get_matcher(ctx)
+        
+        return [matcher] if matcher.has_aliases() else []
+    
+    def get_text(self, og_text, ctx = None, aliases = []) -> str:
+        """Search text with the aliases replaced"""
         # if context exists to get aliases from
         if ctx:
             text = util.text.search_text(og_text, ignore_space = True)
             
-            # organize aliases
-            aliases = sql.user.get(ctx.author.id).get("alias") or []
-            
-            if ctx.guild:
-                guild = sql.server.get(ctx.guild.id).get("alias") or []
-                
-                aliases = aliases + guild
-            
-            for value in aliases: # loop in order
-                original = value["og"]["clean"] #original
-                alias = value["alias"]["clean"] #alias 
-                
-                # find alias that is between whitespace or/and
-                # has 0-2 numbers in the end
-                regex = r"\b" + alias + r"\d{0,2}\b"
-                
-                regex = re.search(regex, text)
-                
-                # ^ regex jank to find if the name is in the text
-                
-                # if it finds it, replace it with the alias
-                if regex:
-                    new = regex.group(0).replace(alias, original)
-                    
-                    text = text[:regex.start()] + new + text[regex.end():]
+            for matcher in aliases:
+                text = matcher.replace(text)
             
-            text = util.text.search_text(text)
+            return util.text.search_text(text)
             
         else:
-            text = util.text.search_text(og_text)
-        
+            return util.text.search_text(og_text)
+    
+    def find(self, text, ctx = None, keys = None) -> tuple:
+        """Items found with the text, and the alt keys that have it
+        If keys is passed, only those are checked for alt names
+        Keys are None if the alt names weren't checked"""
         finds = []
         
         # Pick a random entry
         if text.startswith("random") and (not(ctx) or ctx.allow_random):
             finds.append(self.random_pick())
             
+            return finds, None
+            
         #  try searching if it's a hard alt name
         elif text in self.hard:
             finds.append(self.hard[text])
             
-        elif text:
-            for key, value in self.alt.items():
-                for name in value:
-                    if text in name:
-                        finds.append(self.items[key])
-                        break
+            return finds, None
             
-        return SearchResult(finds, self, og_text)
+        elif not text:
+            return finds, None
+            
+        candidates = self.get_candidates(text)
+        
+        if keys is not None and len(keys) < len(candidates):
+            candidates = keys
+        
+        keys = []
+        
+        for key in candidates:
+            for name in self.alt[key]:
+                if text in name:
+                    finds.append(self.items[key])
+                    keys.append(key)
+                    break
+        
+        return finds, keys
+    
+    def has_prefix(self, text) -> bool:
+        """If any hard alt name starts with text"""
+        i = bisect.bisect_left(self.hard_sorted, text)
+        
+        return i < len(self.hard_sorted) and self.hard_sorted[i].startswith(text)
+    
+    def get_candidates(self, text) -> list:
+        """Alt keys that have all the n-grams of text, might still not have text itself"""
+        size = min(gram_size, len(text))
+        
+        result = None
+        
+        # the rarest n-gram has the least amount of keys to check
+        for i in range(len(text) - size + 1):
+            keys = self.grams.get(text[i:i + size])
+            
+            if keys is None:
+                return []
+                
+            if result is None or len(keys) < len(result):
+                result = keys
+                
+        return result or []
     
     def random_pick(self):
         item = random.choice(list(self.items.keys()))
@@ -301,6 +410,8 @@ class Pool:
         found_word = []
         current_word = []
         
+        session = SearchSession(self, ctx)
+        
         for word in words:
             # ignore common parameters if there's already one result
             if result and result.len() == 1 and word[0] in ["-", "~", "+", "?", "$"]:
@@ -311,7 +422,7 @@ class Pool:
             current_word.append(word)
             current = new.strip()
             
-            search = self.search(new, ctx)
+            search = session.search(new)
             
             if search.has_results():
                 if (result is None) or (search.len() <= result.len()):
@@ -320,6 +431,9 @@ class Pool:
                 found_word = current_word.copy()
                 found = current
                 
+            # adding more words won't find anything else
+            if session.is_done():
+                break
             
         not_word = []
         
@@ -330,19 +444,130 @@ class Pool:
         
 
 loaded_pools = {}
+mixed_pools = {}
 
 def get_pool(file_path):
     if not file_path in loaded_pools:
-        pool = Pool()
-        pool.section(file_path)
+        pools = get_snapshot()
+        
+        if file_path in pools:
+            pool = pools[file_path]
+            
+        else:
+            pool = Pool()
+            pool.section(file_path)
+            
+            snapshot_state["changed"] = True
         
         loaded_pools[file_path] = pool
         
     return loaded_pools[file_path]
     
-# TODO: Make a way to store these
 def mix_pool(*pools):
-    pool = Pool()
-    pool.mix(*pools)
+    key = tuple(pool.key for pool in pools)
+    
+    if not key in mixed_pools:
+        snapshot = get_snapshot()
+        
+        if key in snapshot:
+            pool = snapshot[key]
+            
+        else:
+            pool = Pool()
+            pool.mix(*pools)
+            
+            snapshot_state["changed"] = True
+            
+        mixed_pools[key] = pool
+    
+    return mixed_pools[key]
+
+###############################
+## Snapshot
+# Finished pools are saved to a file, so they don't need to be built again
+# on the next boot if the database didn't change.
+
+# change this if the snapshot itself is saved differently
+snapshot_version = 2
+snapshot_path = ".oifey/pools.pickle"
+
+# code that builds the pools, checked like the database files so changing it builds them again
+code_files = [os.path.relpath(__file__), os.path.relpath(util.text.__file__)]
+
+snapshot_state = {"pools": None, "changed": False}
+
+def get_fingerprint(file_path, mtime = None) -> list:
+    if mtime is None:
+        mtime = os.stat(file_path).st_mtime_ns
+    
+    with open(file_path, "rb") as f:
+        return [mtime, hashlib.sha1(f.read()).hexdigest()]
+        
+def check_sources(sources) -> bool:
+    """If all files used to build the snapshot are still the same"""
+    for file_path, value in sources.items():
+        try:
+            mtime = os.stat(file_path).st_mtime_ns
+            
+        except OSError:
+            return False
+        
+        # only read the file if it looks like it changed
+        if mtime != value[0]:
+            if get_fingerprint(file_path, mtime)[1] != value[1]:
+                return False
+                
+            # same content, save again with the new mtime
+            snapshot_state["changed"] = True
+            
+    return True
+
+def load_snapshot() -> dict:
+    if not os.path.isfile(snapshot_path):
+        return {}
+        
+    try:
+        with open(snapshot_path, "rb") as f:
+            data = pickle.load(f)
+            
+    except Exception as e:
+        print("Couldn't read pool snapshot! ", e)
+        
+        return {}
+        
+    if data.get("version") != snapshot_version or not check_sources(data["sources"]):
+        return {}
+        
+    return data["pools"]
+    
+def get_snapshot() -> dict:
+    if snapshot_state["pools"] is None:
+        snapshot_state["pools"] = load_snapshot()
+        
+    return snapshot_state["pools"]
+
+def save_snapshot() -> None:
+    """Save all pools built so far, only if one of them wasn't in the snapshot"""
+    if not snapshot_state["changed"]:
+        return
+    
+    sources = {}
+    
+    for file_path in list(loaded_pools.keys()) + lexicon_files + code_files:
+        sources[file_path] = get_fingerprint(file_path)
+    
+    data = {
+        "version": snapshot_version,
+        "sources": sources,
+        "pools": {**loaded_pools, **mixed_pools}
+    }
+    
+    util.file.create_folder(os.path.dirname(snapshot_path))
+    
+    # write to another file first so a crash never leaves half a snapshot
+    with open(snapshot_path + ".tmp", "wb") as f:
+        pickle.dump(data, f, protocol = pickle.HIGHEST_PROTOCOL)
+        
+    os.replace(snapshot_path + ".tmp", snapshot_path)
     
-    return pool
\ No newline at end of file
+    snapshot_state["changed"] = False
@@ -1,67 +1,464 @@
-import sqlite3, json
+import sqlite3, json, asyncio, atexit, time, threading, queue
+import concurrent.futures
+
+from collections import OrderedDict
 
 import oifey.util as util
 
 util.file.create_folder(".oifey")
 
-connection = sqlite3.connect(".oifey/lite.db")
-cursor = connection.cursor()
+DATABASE = ".oifey/lite.db"
 
 banned_words = ['"', "'", "\\", "\n"]
 
+# Changes are kept in memory and written together in one transaction
+# seconds to wait before writing
+FLUSH_DELAY = 5.0
+# write right away if this many rows are waiting
+FLUSH_SIZE = 100
+
+# Rows are only read when they're used, and the least used ones are removed from memory
+# max size (bytes of JSON) of the rows kept by each table
+CACHE_BYTES = 8 * 1024 * 1024
+# counted for every row, even the ones that don't exist
+ROW_SIZE = 64
+
+tables = []
+
+# timer for the next write
+flush_handle = None
+
+stats = {
+    "updates": 0,
+    "flushes": 0,
+    "rows": 0,
+    "time": 0.0
+}
+
+# Database thread
+# everything that uses the connection runs on it, so the bot never waits for the disk
+jobs = queue.Queue()
+
+connection = None
+
+def database_thread():
+    while True:
+        func, args, future = jobs.get()
+        
+        if not future.set_running_or_notify_cancel():
+            continue
+            
+        try:
+            future.set_result(func(*args))
+            
+        except BaseException as e:
+            future.set_exception(e)
+
+# daemon so it doesn't block closing, the atexit flush still runs before it stops
+thread = threading.Thread(target=database_thread, name="oifey-sql", daemon=True)
+thread.start()
+
+def run(func, *args) -> concurrent.futures.Future:
+    """Run a function on the database thread"""
+    future = concurrent.futures.Future()
+    
+    jobs.put((func, args, future))
+    
+    return future
+
+async def run_async(func, *args):
+    return await asyncio.wrap_future(run(func, *args))
+
+def connect():
+    global connection
+    
+    connection = sqlite3.connect(DATABASE, check_same_thread=False)
+    
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+
+run(connect).result()
+
 class Table:
     def __init__(self, key):
         self.key = key
         
-        # try pulling from table
-        # if not, create one
+        # name -> value, None if it was dropped
+        self.dirty = {}
         
-        try:
-            self.data = self.select()
+        # name -> value, None if it's not in the database
+        # least recently used first
+        self.data = OrderedDict()
+        
+        # name -> size of the row
+        self.sizes = {}
+        self.size = 0
+        
+        self.hits = 0
+        self.misses = 0
+        
+        run(self.create).result()
+        
+        tables.append(self)
+        
+    def create(self):
+        columns = connection.execute(f'PRAGMA table_info("{self.key}")').fetchall()
+        
+        # Old tables were just (name, data) without types or a primary key
+        # move the rows to the new one, the last row with a name is the one kept
+        if columns and not any(x[5] for x in columns):
+            connection.execute("BEGIN")
             
-        except sqlite3.OperationalError:
-            cursor.execute(f"CREATE TABLE {self.key}(name, data)")
+            connection.execute(f'ALTER TABLE "{self.key}" RENAME TO "{self.key}_old"')
+            connection.execute(f'CREATE TABLE "{self.key}"(name INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+            connection.execute(f'INSERT OR REPLACE INTO "{self.key}"(name, data) SELECT name, data FROM "{self.key}_old" ORDER BY rowid')
+            connection.execute(f'DROP TABLE "{self.key}_old"')
             
-            self.data = self.select()
+            connection.commit()
             
-    def select(self):
-        "Gets all of the data in the table and stores in a dict for easy use"
-        current = cursor.execute(f"SELECT * FROM '{self.key}'")
+        else:
+            connection.execute(f'CREATE TABLE IF NOT EXISTS "{self.key}"(name INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+            connection.commit()
+            
+    def select(self, name):
+        "Gets the JSON of one row, None if it doesn't exist"
+        current = connection.execute(f'SELECT data FROM "{self.key}" WHERE name = ?', (name,))
         
-        result = {}
+        value = current.fetchone()
         
-        for value in current.fetchall():
-           result[value[0]] = json.loads(value[1])
-
-        return result
+        return value[0] if value else None
+        
+    def load(self, name):
+        """Get row from memory, or read it from the database
+        Waits for the database thread, use load_async in the event loop"""
+        if name in self.data:
+            self.data.move_to_end(name)
+            self.hits += 1
+            
+            return self.data[name]
+            
+        self.misses += 1
+        
+        # queued after any write, so it's never older than the memory
+        text = run(self.select, name).result()
+        
+        return self.read(name, text)
+        
+    async def load_async(self, name):
+        """Same as load, the loop keeps running while the row is read"""
+        if name in self.data:
+            self.data.move_to_end(name)
+            self.hits += 1
+            
+            return self.data[name]
+            
+        self.misses += 1
+        
+        text = await run_async(self.select, name)
+        
+        # updated or read by another command while waiting, the memory is newer
+        if name in self.data:
+            self.data.move_to_end(name)
+            
+            return self.data[name]
+            
+        return self.read(name, text)
+        
+    def read(self, name, text):
+        if text is None:
+            value = None
+            
+        else:
+            value = json.loads(text)
+            
+        self.cache(name, value, len(text or ""))
+        
+        return value
+        
+    def cache(self, name, value, size = None):
+        self.data[name] = value
+        self.data.move_to_end(name)
+        
+        if size is not None:
+            self.set_size(name, size)
+            
+        elif not name in self.sizes:
+            self.set_size(name, 0)
+            
+        self.trim()
+        
+    def set_size(self, name, size):
+        size += ROW_SIZE
+        
+        self.size += size - self.sizes.get(name, 0)
+        self.sizes[name] = size
         
+    def trim(self):
+        """Remove least used rows until it's under CACHE_BYTES, rows waiting to be written stay"""
+        if self.size <= CACHE_BYTES:
+            return
+            
+        remove = []
+        size = self.size
+        
+        for name in self.data:
+            if size <= CACHE_BYTES:
+                break
+                
+            if name in self.dirty:
+                continue
+                
+            size -= self.sizes[name]
+            remove.append(name)
+            
+        for name in remove:
+            self.data.pop(name)
+            self.size -= self.sizes.pop(name)
+            
     def get(self, name):
-        if not name in self.data:
+        value = self.load(name)
+        
+        if value is None:
             return {}
             
         else:
-            return self.data[name]
+            return value
+            
+    async def get_async(self, name):
+        value = await self.load_async(name)
+        
+        if value is None:
+            return {}
+            
+        else:
+            return value
             
     def update(self, name, value):
-        text = json.dumps(value)
+        self.dirty[name] = value
+        self.cache(name, value)
         
-        if not name in self.data:
-            cursor.execute(f"INSERT INTO '{self.key}' VALUES ({name}, '{text}');")
+        schedule()
         
-        else:
-            cursor.execute(f"UPDATE '{self.key}' SET data = '{text}' WHERE name = {name}")
+    def drop(self, name):
+        self.dirty[name] = None
+        self.cache(name, None, 0)
         
-        connection.commit()
+        schedule()
+        
+    def get_changes(self):
+        """(statement, parameters) for every dirty row"""
+        result = []
+        
+        for name, value in self.dirty.items():
+            if value is None:
+                result.append((f'DELETE FROM "{self.key}" WHERE name = ?', (name,)))
+                
+            else:
+                text = json.dumps(value)
+                
+                # now that the size is known
+                if name in self.sizes:
+                    self.set_size(name, len(text))
+                    
+                result.append((f'INSERT INTO "{self.key}"(name, data) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET data = excluded.data', (name, text)))
+                
+        self.dirty = {}
+        self.trim()
+        
+        return result
 
-        self.data[name] = value
+class AliasTable:
+    """Aliases of users and servers, one row for each alias
+    Used to be a list in the "alias" key of the user/server rows"""
+    def __init__(self, *owners):
+        run(self.create, [x.key for x in owners]).result()
         
-    def drop(self, name):
-        if name in self.data: self.data.pop(name)
+    def create(self, owners):
+        exists = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'alias'").fetchone()
+        
+        connection.execute("BEGIN")
         
-        cursor.execute(f"DELETE FROM '{self.key}' WHERE name = {name}")
+        connection.execute("""CREATE TABLE IF NOT EXISTS alias(
+            id INTEGER PRIMARY KEY,
+            owner TEXT NOT NULL,
+            owner_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            og_clean TEXT NOT NULL,
+            og_display TEXT NOT NULL,
+            alias_clean TEXT NOT NULL,
+            alias_display TEXT NOT NULL
+        )""")
         
+        connection.execute("CREATE INDEX IF NOT EXISTS alias_owner ON alias(owner, owner_id, position)")
+        connection.execute("CREATE INDEX IF NOT EXISTS alias_text ON alias(alias_clean)")
+        
+        # move the aliases out of the old rows, only once
+        if not exists:
+            for owner in owners:
+                for name, text in connection.execute(f'SELECT name, data FROM "{owner}"').fetchall():
+                    data = json.loads(text)
+                    
+                    if not "alias" in data:
+                        continue
+                        
+                    for i, value in enumerate(data.pop("alias") or []):
+                        connection.execute("INSERT INTO alias(owner, owner_id, position, og_clean, og_display, alias_clean, alias_display) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (owner, name, i, value["og"]["clean"], value["og"]["display"], value["alias"]["clean"], value["alias"]["display"]))
+                        
+                    if data:
+                        connection.execute(f'UPDATE "{owner}" SET data = ? WHERE name = ?', (json.dumps(data), name))
+                        
+                    else:
+                        connection.execute(f'DELETE FROM "{owner}" WHERE name = ?', (name,))
+                        
         connection.commit()
         
+    def select(self, owner, name):
+        current = connection.execute("SELECT og_clean, og_display, alias_clean, alias_display FROM alias WHERE owner = ? AND owner_id = ? ORDER BY position", (owner, name))
+        
+        result = []
+        
+        for value in current.fetchall():
+            result.append({
+                "og": {"clean": value[0], "display": value[1]},
+                "alias": {"clean": value[2], "display": value[3]}
+            })
+            
+        return result
+        
+    def insert(self, owner, name, value, limit = None):
+        """False if there's already limit aliases, checked here so commands at the same time can't go over it"""
+        with connection:
+            if limit is not None:
+                count = connection.execute("SELECT COUNT(*) FROM alias WHERE owner = ? AND owner_id = ?", (owner, name)).fetchone()[0]
+                
+                if count >= limit:
+                    return False
+                    
+            connection.execute("""INSERT INTO alias(owner, owner_id, position, og_clean, og_display, alias_clean, alias_display)
+            SELECT ?, ?, COALESCE(MAX(position) + 1, 0), ?, ?, ?, ? FROM alias WHERE owner = ? AND owner_id = ?""",
+            (owner, name, value["og"]["clean"], value["og"]["display"], value["alias"]["clean"], value["alias"]["display"], owner, name))
+            
+        return True
+        
+    def delete(self, owner, name, index):
+        """False if there's no alias in that position"""
+        with connection:
+            current = connection.execute("DELETE FROM alias WHERE owner = ? AND owner_id = ? AND position = ?", (owner, name, index))
+            
+            if current.rowcount == 0:
+                return False
+                
+            connection.execute("UPDATE alias SET position = position - 1 WHERE owner = ? AND owner_id = ? AND position > ?", (owner, name, index))
+            
+        return True
+            
+    async def get_async(self, table, name) -> list:
+        """Aliases of a user/server in order, [{"og": {"clean", "display"}, "alias": {...}}]"""
+        return await run_async(self.select, table.key, name)
+        
+    def add(self, table, name, value, limit = None):
+        """Add alias to the end, written on the database thread
+        The future is False if the limit was reached"""
+        return run(self.insert, table.key, name, value, limit)
+        
+    def remove(self, table, name, index):
+        """Remove alias by its position (starting at 0)
+        The future is False if it doesn't exist"""
+        return run(self.delete, table.key, name, index)
+
+def pending():
+    return sum(len(table.dirty) for table in tables)
+
+def write(changes):
+    """Runs on the database thread"""
+    start = time.perf_counter()
+    
+    with connection:
+        for statement, parameters in changes:
+            connection.execute(statement, parameters)
+            
+    stats["flushes"] += 1
+    stats["rows"] += len(changes)
+    stats["time"] += time.perf_counter() - start
+
+def flush():
+    """Send every waiting change to the database thread, they're written in one transaction
+    Returns the future of the write, or None if there was nothing to write"""
+    global flush_handle
+    
+    if flush_handle is not None:
+        flush_handle.cancel()
+        flush_handle = None
+        
+    changes = []
+    
+    # values are turned into JSON now, they can still be changed after this
+    for table in tables:
+        changes += table.get_changes()
+        
+    if not changes:
+        return None
+        
+    future = run(write, changes)
+    future.add_done_callback(check_write)
+    
+    return future
+
+def check_write(future):
+    if future.exception() is not None:
+        print("Database write failed:", repr(future.exception()))
+
+def schedule():
+    global flush_handle
+    
+    stats["updates"] += 1
+    
+    if pending() >= FLUSH_SIZE:
+        flush()
+        
+        return
+        
+    if flush_handle is not None:
+        return
+        
+    try:
+        loop = asyncio.get_running_loop()
+        
+    # not running in the bot, just write now
+    except RuntimeError:
+        flush()
+        
+        return
+        
+    flush_handle = loop.call_later(FLUSH_DELAY, flush)
+
+def close():
+    """Write everything left and wait for it"""
+    flush()
+    
+    # jobs run in order, so everything before this one is done too
+    run(lambda: None).result()
+
+def get_stats():
+    """Updates, flushes and rows written, rows/s is only the time spent writing
+    and the rows in memory for each table"""
+    result = stats.copy()
+    
+    result["pending"] = pending()
+    
+    for table in tables:
+        result[table.key] = {"rows": len(table.data), "bytes": table.size, "hits": table.hits, "misses": table.misses}
+        
+    result["rows/s"] = result["rows"] / result["time"] if result["time"] else 0.0
+    
+    return result
+
+# write whatever is left when closing
+atexit.register(close)
+
 # common used tables
 user = Table("user")
-server = Table("server")
\ No newline at end of file
+server = Table("server")
+
+aliases = AliasTable(user, server)
@@ -1,7 +1,62 @@
+import functools, re
+
 replace_blank = ['(', ' ', ')', "'", '"', '-', '~', '_', '.', '&', '?', '!', '%', "$", '—', '’', '@', '+', '/', '\\', '·', ':', ',', '|', 'Ω', 'Θ', '*', "}", "{", ";", "*"]
 replace_char = {'%27': '', '%C3%A1': 'a', '%C3%AD': 'i', '%C3%BA': 'u', '%C3%A7': 'c', '%22': '', '%C3%A9': 'e', 'é': 'e', 'ð': 'd', 'á': 'a', 'ö': 'o',
 'ý': 'y', 'þ': 'p', 'ú': 'u', 'ó': 'o', 'í': 'i', 'ø': 'o', 'æ': 'ae', 'Þ': 'p', 'ò': 'o', 'ù': 'u', 'ñ': 'n', 'ä': 'a'}
 
+# (ignore_plus, ignore_space, blank) -> str.translate tables
+blank_tables = {}
+
+# replace_char split in the multiple character keys (one regex)
+# and the single character ones (str.translate)
+multi_char = {k: v for k, v in replace_char.items() if len(k) > 1}
+multi_char_regex = re.compile("|".join(re.escape(x) for x in multi_char))
+
+char_table = str.maketrans({k: v for k, v in replace_char.items() if len(k) == 1})
+
+def get_tables(ignore_plus, ignore_space, blank) -> list:
+    """Tables to use with str.translate, in order
+    None means the multiple character keys need to be replaced there"""
+    key = (ignore_plus, ignore_space, blank)
+    
+    if not key in blank_tables:
+        active = []
+        
+        for x in replace_blank:
+            if ignore_plus and x == '+': continue
+            elif ignore_space and x == ' ': continue
+            
+            active.append(x)
+        
+        table = {}
+        
+        # same result as replacing them one after another
+        for i, x in enumerate(active):
+            if ord(x) in table: continue
+            
+            value = blank
+            
+            for y in active[i + 1:]:
+                value = value.replace(y, blank)
+                
+            table[ord(x)] = value
+        
+        # all multiple character keys start with %, which is always blanked
+        # so if the blank doesn't add it back everything fits in one table
+        if "%" in blank:
+            blank_tables[key] = [table, None, char_table]
+            
+        else:
+            merged = dict(char_table)
+            
+            for k, v in table.items():
+                merged[k] = v.translate(char_table) or None
+                
+            blank_tables[key] = [merged]
+        
+    return blank_tables[key]
+
+@functools.lru_cache(maxsize = 65536)
 def search_text(text, ignore_plus = False, ignore_space = False, blank = '') -> str:
     text = text.lower()
     
@@ -11,14 +66,12 @@ def search_text(text, ignore_plus = False, ignore_space = False, blank = '') ->
         plus += "+"
         text = text[:-1]
 
-    for x in replace_blank:
-        if ignore_plus and x == '+': continue
-        elif ignore_space and x == ' ': continue
-
-        text = text.replace(x, blank)
-
-    for key, value in replace_char.items():
-        text = text.replace(key, value)
+    for table in get_tables(ignore_plus, ignore_space, blank):
+        if table is None:
+            text = multi_char_regex.sub(lambda match: multi_char[match.group(0)], text)
+            
+        else:
+            text = text.translate(table)
     
     text += plus
     return text.strip()
@@ -41,15 +94,9 @@ class ParameterValue:
     def print(self):
         print(self.key, self.start, self.value)
 
-def get_parameters(words, parameters, start_keys = ["-", "~"]) -> list:
-    """Get parameters
-    Janky as hell but it works"""
-    
-    result = []
-    invalid_words = []
-    
-    # It doesn't matter much but this rly shouldn't be done more than
-    # one time
+def get_valid_value(parameters) -> dict:
+    """Parameter keys that can be followed by a value
+    key -> None, or the only start key it can be used with"""
     valid_value = {}
     
     for par in parameters:
@@ -62,6 +109,19 @@ def get_parameters(words, parameters, start_keys = ["-", "~"]) -> list:
                     
             else:
                 valid_value = {**valid_value, **values}
+                
+    return valid_value
+
+def get_parameters(words, parameters, start_keys = ["-", "~"], valid_value = None) -> list:
+    """Get parameters
+    Janky as hell but it works
+    valid_value can be made before with get_valid_value"""
+    
+    result = []
+    invalid_words = []
+    
+    if valid_value is None:
+        valid_value = get_valid_value(parameters)
     
     option = None
     option_start = None
@@ -69,15 +129,12 @@ def get_parameters(words, parameters, start_keys = ["-", "~"]) -> list:
     
     
     for word in words:
-    
-        def check_start():
-            for x in start_keys:
-                if word.startswith(x):
-                    return x
-                
-            return False
+        start = False
         
-        start = check_start()
+        for x in start_keys:
+            if word.startswith(x):
+                start = x
+                break
         
         if start:
             if not option is None:
@@ -0,0 +1,192 @@
+import asyncio, multiprocessing
+import concurrent.futures
+
+from lua import lua, almanac, to_table, from_table
+
+# Workspaces (averages, compare, builds...) are run in other processes so they
+# don't block the bot while they're calculating, 0 = run them in this process
+WORKERS = 2
+
+# Max commands sent to the workers at once, everything else waits for a spot
+QUEUE_SIZE = 16
+
+executor = None
+queue = asyncio.Semaphore(QUEUE_SIZE)
+
+# only one restart at a time
+restart_lock = asyncio.Lock()
+
+# lua path (tuple) -> game table
+tables = {}
+
+def get_table(path):
+    path = tuple(path)
+
+    if not path in tables:
+        table = almanac.game
+
+        for key in path:
+            table = table[key]
+
+        tables[path] = table
+
+    return tables[path]
+
+def summon(path, options):
+    """Get the lua table with the options organized and set"""
+    table = get_table(path)
+    table = table.new(table, options["name"])
+
+    new = options.copy()
+    new.pop("name")
+
+    table.set_options(table, to_table(new))
+
+    return table
+
+def get_infobox(box):
+    return {
+        "has_pages": False,
+        "settings": from_table(box.settings),
+        "fields": [from_table(box.fields[key]) for key in box.fields],
+        "images": from_table(box.images)
+    }
+
+def get_pagebox(box):
+    buttons = []
+
+    for _, button in box.buttons.items():
+        button = from_table(button)
+        button["show"] = list(button["show"].values())
+
+        buttons.append(button)
+
+    return {
+        "has_pages": True,
+        "pages": [get_infobox(page) for _, page in box.pages.items()],
+        "buttons": buttons
+    }
+
+# counts math.random calls, to know if a result can be shown again
+random_count = lua.eval('''(function()
+    local random = math.random
+    local count = 0
+    
+    math.random = function(...)
+        count = count + 1
+        return random(...)
+    end
+    
+    return function() return count end
+end)()''')
+
+def render(path, options, comma = None):
+    """Summon and show a workspace, returns the infobox/pagebox as a dict
+    Units in options[comma] (option dicts) are summoned first to compare them
+    "random" is true if the result used math.random"""
+    count = random_count()
+
+    if comma and comma in options:
+        options = options.copy()
+        options[comma] = [summon(path, x) if isinstance(x, dict) else x for x in options[comma]]
+
+    table = summon(path, options)
+    box = table.show(table)
+
+    if box.has_pages:
+        result = get_pagebox(box)
+
+    else:
+        result = get_infobox(box)
+
+    result["random"] = random_count() != count
+
+    return result
+
+# forked workers start with the same random state, so give each one a new seed
+def init():
+    lua.execute("math.randomseed()")
+
+def warm():
+    return True
+
+def make():
+    """New workers, forked from this process so they start with the modules already loaded
+    Called from the event loop thread, so no other code is using lua while forking"""
+    return concurrent.futures.ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("fork"), initializer=init)
+
+def start():
+    """Start the workers, this needs to be called before the bot starts running"""
+    global executor
+
+    if WORKERS <= 0 or not "fork" in multiprocessing.get_all_start_methods():
+        return
+
+    executor = make()
+
+    # all workers are created on the first submit
+    executor.submit(warm).result()
+
+def stop():
+    """Doesn't wait for the workers to close"""
+    global executor
+
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
+
+async def restart(broken):
+    """Replace the workers if they're still the ones that broke
+    Commands that got the same error at the same time only restart them once"""
+    global executor
+
+    async with restart_lock:
+        if executor is not broken:
+            return
+
+        executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+        new = make()
+
+        # the processes are forked on submit, waiting for them to start doesn't block the loop
+        try:
+            await asyncio.wrap_future(new.submit(warm))
+
+        except Exception as e:
+            print("Couldn't restart the workers:", repr(e))
+
+            new.shutdown(wait=False, cancel_futures=True)
+            return
+
+        executor = new
+
+async def get_executor():
+    """The workers, after waiting for a restart if there's one"""
+    while restart_lock.locked():
+        async with restart_lock:
+            pass
+
+    return executor
+
+async def run(path, options, comma = None):
+    if executor is None and not restart_lock.locked():
+        return render(path, options, comma)
+
+    async with queue:
+        current = await get_executor()
+
+        # couldn't restart them
+        if current is None:
+            return render(path, options, comma)
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            return await loop.run_in_executor(current, render, path, options, comma)
+
+        # a worker died, start new ones for the next commands
+        except concurrent.futures.process.BrokenProcessPool:
+            await restart(current)
+
+            raise
@@ -0,0 +1,41 @@
+import os, time
+import lua
+
+# Compares the pure Lua JSON decoder with the one from lua.py
+# Run from the main folder: python -m scripts.bench_json
+
+json = lua.lua.eval('(require("almanac.lib.json"))')
+file = lua.lua.eval('(require("almanac.util.file"))')
+
+def bench():
+    games = {}
+
+    for root, dirs, files in os.walk("database"):
+        for file_path in files:
+            if not file_path.endswith(".json"): continue
+
+            path = root + "/" + file_path
+            game = root.split("/")[1] if "/" in root else "database"
+
+            if not game in games:
+                games[game] = [0, 0]
+
+            start = time.perf_counter()
+            json.decode(file.read(path))
+            games[game][0] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            lua.json_read(path)
+            games[game][1] += time.perf_counter() - start
+
+    total = [0, 0]
+
+    for game, value in sorted(games.items(), key=lambda x: -x[1][0]):
+        print(f"{game:<10} lua {value[0]:.2f}s | python {value[1]:.2f}s | {value[0] / value[1]:.1f}x")
+
+        total[0] += value[0]
+        total[1] += value[1]
+
+    print(f"{'total':<10} lua {total[0]:.2f}s | python {total[1]:.2f}s | {total[0] / total[1]:.1f}x")
+
+bench()
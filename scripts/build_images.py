@@ -0,0 +1,133 @@
+import os, json
+import maji.attachment as attachment
+
+# Makes smaller versions of the database images for each embed key,
+# Embed.attach uses them instead of the full image when they're listed in the manifest
+# Needs Pillow (pip install Pillow), the bot works the same without it
+# Run from the main folder: python -m scripts.build_images
+
+try:
+    from PIL import Image
+
+except ImportError:
+    Image = None
+
+# max width/height for each key, about twice the size discord shows them
+SIZES = {
+    "thumbnail": 160,
+    "author_icon": 48,
+    "footer_icon": 48,
+    "image": 800
+}
+
+# gifs are left alone, they can be animated
+EXTENSIONS = ["png", "webp", "jpg", "jpeg"]
+
+def save(image, path, file_type):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if file_type == "png":
+        image.save(path, optimize=True)
+
+    elif file_type == "webp":
+        image.save(path, quality=90, method=6)
+
+    else:
+        image.convert("RGB").save(path, quality=85, optimize=True)
+
+def build_file(path, file_type):
+    """Variants of one image, {key: path}"""
+    result = {}
+    size = os.path.getsize(path)
+
+    with Image.open(path) as image:
+        if getattr(image, "is_animated", False):
+            return result
+
+        if image.mode == "P":
+            image = image.convert("RGBA")
+
+        # max size -> path, keys with the same size use the same file
+        made = {}
+
+        for key, max_size in SIZES.items():
+            if max(image.size) <= max_size:
+                continue
+
+            if max_size in made:
+                if made[max_size]:
+                    result[key] = made[max_size]
+
+                continue
+
+            variant = image.copy()
+            variant.thumbnail((max_size, max_size), Image.LANCZOS)
+
+            variant_path = os.path.join(attachment.VARIANT_FOLDER, str(max_size), path)
+            save(variant, variant_path, file_type)
+
+            # not worth it if it isn't smaller
+            if os.path.getsize(variant_path) >= size:
+                os.remove(variant_path)
+                made[max_size] = None
+                continue
+
+            result[key] = variant_path
+            made[max_size] = variant_path
+
+    return result
+
+def build():
+    if Image is None:
+        print("Pillow is not installed, pip install Pillow")
+        return
+
+    old = {}
+
+    if os.path.isfile(attachment.MANIFEST_FILE):
+        with open(attachment.MANIFEST_FILE, "r") as f:
+            data = json.load(f)
+
+        # made with other sizes, everything needs to be made again
+        if data.get("sizes") == SIZES:
+            old = data["files"]
+
+    files = {}
+    count = [0, 0]
+
+    for folder in attachment.FOLDERS:
+        for root, dirs, names in os.walk(folder):
+            for name in names:
+                file_type = name.split(".")[-1].lower()
+
+                if not file_type in EXTENSIONS: continue
+
+                path = attachment.get_path(os.path.join(root, name))
+                stat = os.stat(path)
+
+                value = old.get(path)
+
+                # same file as last time and the variants are still there
+                if value and value["size"] == stat.st_size and value["mtime"] == stat.st_mtime and all(os.path.isfile(x) for x in value["keys"].values()):
+                    files[path] = value
+                    continue
+
+                try:
+                    keys = build_file(path, file_type)
+
+                except OSError as e:
+                    print(path, repr(e))
+                    continue
+
+                files[path] = {"size": stat.st_size, "mtime": stat.st_mtime, "keys": keys}
+                count[0] += 1
+                count[1] += len(keys)
+
+    os.makedirs(attachment.VARIANT_FOLDER, exist_ok=True)
+
+    with open(attachment.MANIFEST_FILE, "w") as f:
+        json.dump({"sizes": SIZES, "files": files}, f)
+
+    print(f"{count[0]} new or changed images, {count[1]} variants made, {len(files)} in the manifest")
+
+build()